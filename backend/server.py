@@ -1,9 +1,11 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, status, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, status, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 import os
 import logging
 import re
@@ -11,9 +13,22 @@ import json
 import base64
 import time
 import asyncio
+import hashlib
+import anyio
+import array
+import math
+import random
+import wave
+import shutil
+import functools
+import itertools
+import hmac
+import mimetypes
+from collections import OrderedDict
+import numpy as np
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Literal, Dict
+from typing import List, Optional, Literal, Dict, Callable, Awaitable
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
@@ -32,6 +47,7 @@ import pdfplumber
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 from elevenlabs import ElevenLabs
 from elevenlabs.types import VoiceSettings
+import imageio_ffmpeg
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -41,32 +57,258 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
-# API Keys
-EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
-ELEVENLABS_API_KEY = os.environ.get('ELEVENLABS_API_KEY')
-
-# Cloudinary configuration
-CLOUDINARY_CONFIGURED = False
-if os.environ.get('CLOUDINARY_CLOUD_NAME') and os.environ.get('CLOUDINARY_CLOUD_NAME') != 'your_cloud_name':
-    cloudinary.config(
-        cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
-        api_key=os.environ.get('CLOUDINARY_API_KEY'),
-        api_secret=os.environ.get('CLOUDINARY_API_SECRET'),
-        secure=True
-    )
-    CLOUDINARY_CONFIGURED = True
+# ============== PROVIDERS ==============
+# External services sit behind small provider classes, selected with
+# LLM_PROVIDER, TTS_PROVIDER, EMAIL_PROVIDER and STORAGE_PROVIDER. Setting one
+# to "local" swaps in an offline stand-in with configurable latency and
+# failure rate and deterministic output, for load tests and benchmarks.
+
+LOCAL_PROVIDER_LATENCY_MS = float(os.environ.get('LOCAL_PROVIDER_LATENCY_MS', '0'))
+LOCAL_PROVIDER_FAILURE_RATE = float(os.environ.get('LOCAL_PROVIDER_FAILURE_RATE', '0'))
+local_provider_random = random.Random(os.environ.get('LOCAL_PROVIDER_SEED', 'cuepartner'))
+ELEVENLABS_MODEL_ID = "eleven_multilingual_v2"
+
+class ProviderError(Exception):
+    """A provider call failed. `status_code` carries the upstream HTTP status when known."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+async def simulate_local_call(provider: str):
+    """Apply the configured latency and failure rate to a local stand-in call."""
+    if LOCAL_PROVIDER_LATENCY_MS > 0:
+        await asyncio.sleep(LOCAL_PROVIDER_LATENCY_MS / 1000)
+    if local_provider_random.random() < LOCAL_PROVIDER_FAILURE_RATE:
+        raise ProviderError(f"Simulated {provider} failure", status_code=503)
+
+class LLMProvider:
+    name = "none"
+    configured = False
+
+    async def complete(self, system_message: str, prompt: str) -> str:
+        raise ProviderError("LLM provider not configured")
+
+class EmergentLLMProvider(LLMProvider):
+    name = "emergent"
+
+    def __init__(self, api_key: Optional[str]):
+        self.api_key = api_key
+        self.configured = bool(api_key)
+
+    async def complete(self, system_message: str, prompt: str) -> str:
+        if not self.configured:
+            raise ProviderError("EMERGENT_LLM_KEY not configured")
+        chat = LlmChat(api_key=self.api_key, session_id=f"cuepartner-{uuid.uuid4()}", system_message=system_message)
+        chat = chat.with_model("openai", "gpt-5.2")
+        return await chat.send_message(UserMessage(text=prompt))
+
+class LocalLLMProvider(LLMProvider):
+    """Answers JSON prompts with an empty result of the requested shape.
+
+    Callers then take their non-AI paths (regex parsing, default voices), so
+    the whole pipeline runs offline.
+    """
+    name = "local"
+    configured = True
+
+    async def complete(self, system_message: str, prompt: str) -> str:
+        await simulate_local_call(self.name)
+        return "[]" if "JSON array" in prompt else "{}"
+
+class TTSProvider:
+    name = "none"
+    configured = False
+    audio_format = "mp3"
+
+    async def synthesize(self, text: str, voice_id: str, voice_settings: VoiceSettings) -> bytes:
+        raise ProviderError("TTS provider not configured")
+
+class ElevenLabsTTSProvider(TTSProvider):
+    name = "elevenlabs"
+
+    def __init__(self, api_key: Optional[str]):
+        self.client = None
+        if api_key and api_key != 'your_elevenlabs_api_key_here':
+            self.client = ElevenLabs(api_key=api_key)
+        self.configured = self.client is not None
+
+    async def synthesize(self, text: str, voice_id: str, voice_settings: VoiceSettings) -> bytes:
+        if not self.client:
+            raise ProviderError("ElevenLabs not configured. Please add ELEVENLABS_API_KEY.", status_code=503)
+        
+        def convert() -> bytes:
+            audio_generator = self.client.text_to_speech.convert(
+                text=text,
+                voice_id=voice_id,
+                model_id=ELEVENLABS_MODEL_ID,
+                voice_settings=voice_settings
+            )
+            return b"".join(audio_generator)
+        
+        # The SDK is blocking - keep it off the event loop
+        try:
+            return await asyncio.to_thread(convert)
+        except Exception as e:
+            raise ProviderError(str(e), status_code=getattr(e, "status_code", None)) from e
+
+class LocalTTSProvider(TTSProvider):
+    """Renders each line as a sine tone whose pitch and length derive from the input.
+
+    Output is a 16 kHz mono WAV, so no encoder is needed; identical inputs
+    always produce identical bytes.
+    """
+    name = "local"
+    configured = True
+    audio_format = "wav"
+    sample_rate = 16000
+
+    async def synthesize(self, text: str, voice_id: str, voice_settings: VoiceSettings) -> bytes:
+        await simulate_local_call(self.name)
+        seed = int(hashlib.sha256(f"{voice_id}:{text}".encode()).hexdigest()[:8], 16)
+        frequency = 220 + seed % 440
+        duration = min(8.0, max(0.5, len(text) * 0.06))  # Roughly speaking pace
+        samples = array.array("h", (
+            int(8000 * math.sin(2 * math.pi * frequency * i / self.sample_rate))
+            for i in range(int(duration * self.sample_rate))
+        ))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(samples.tobytes())
+        return buffer.getvalue()
+
+class EmailProvider:
+    name = "none"
+    configured = False
+    sender = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
+
+    max_batch = 1
+
+    async def send(self, params: dict) -> dict:
+        raise ProviderError("Email provider not configured")
+
+    async def send_batch(self, params_list: List[dict]) -> List[dict]:
+        return [await self.send(params) for params in params_list]
+
+class ResendEmailProvider(EmailProvider):
+    name = "resend"
+
+    def __init__(self, api_key: Optional[str]):
+        self.configured = bool(api_key and api_key != 'your_resend_api_key_here')
+        if self.configured:
+            resend.api_key = api_key
+
+    async def send(self, params: dict) -> dict:
+        if not self.configured:
+            raise ProviderError("Resend not configured")
+        # Run sync SDK in thread to keep FastAPI non-blocking
+        try:
+            return await asyncio.to_thread(resend.Emails.send, params)
+        except Exception as e:
+            raise ProviderError(str(e), status_code=getattr(e, "code", None)) from e
+
+    # Resend's batch endpoint accepts up to 100 emails per call
+    max_batch = 100
+
+    async def send_batch(self, params_list: List[dict]) -> List[dict]:
+        if not self.configured:
+            raise ProviderError("Resend not configured")
+        if len(params_list) == 1:
+            return [await self.send(params_list[0])]
+        try:
+            result = await asyncio.to_thread(resend.Batch.send, params_list)
+        except Exception as e:
+            raise ProviderError(str(e), status_code=getattr(e, "code", None)) from e
+        return result.get("data", []) if isinstance(result, dict) else result
+
+class LocalEmailProvider(EmailProvider):
+    """Logs emails instead of sending them."""
+    name = "local"
+    configured = True
+
+    async def send(self, params: dict) -> dict:
+        await simulate_local_call(self.name)
+        message_id = str(uuid.uuid5(uuid.NAMESPACE_URL, json.dumps(params, sort_keys=True, default=str)))
+        logging.info(f"Local email {message_id} to {params.get('to')}: {params.get('subject')}")
+        return {"id": message_id}
+
+class StorageProvider:
+    name = "none"
+    configured = False
+    cloud_name = None
+    api_key = None
+
+    def sign_upload(self, params: dict) -> str:
+        raise ProviderError("Cloud storage not configured")
+
+    async def destroy(self, public_id: str, resource_type: str = "video"):
+        raise ProviderError("Cloud storage not configured")
+
+class CloudinaryStorageProvider(StorageProvider):
+    name = "cloudinary"
+
+    def __init__(self):
+        self.cloud_name = os.environ.get('CLOUDINARY_CLOUD_NAME')
+        self.api_key = os.environ.get('CLOUDINARY_API_KEY')
+        self.api_secret = os.environ.get('CLOUDINARY_API_SECRET')
+        self.configured = bool(self.cloud_name and self.cloud_name != 'your_cloud_name')
+        if self.configured:
+            cloudinary.config(
+                cloud_name=self.cloud_name,
+                api_key=self.api_key,
+                api_secret=self.api_secret,
+                secure=True
+            )
 
-# Initialize ElevenLabs client
-eleven_client = None
-if ELEVENLABS_API_KEY and ELEVENLABS_API_KEY != 'your_elevenlabs_api_key_here':
-    eleven_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+    def sign_upload(self, params: dict) -> str:
+        return cloudinary.utils.api_sign_request(params, self.api_secret)
 
-# Resend Email Configuration
-RESEND_API_KEY = os.environ.get('RESEND_API_KEY')
-SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
-RESEND_CONFIGURED = bool(RESEND_API_KEY and RESEND_API_KEY != 'your_resend_api_key_here')
-if RESEND_CONFIGURED:
-    resend.api_key = RESEND_API_KEY
+    async def destroy(self, public_id: str, resource_type: str = "video"):
+        try:
+            await asyncio.to_thread(cloudinary.uploader.destroy, public_id, resource_type=resource_type, invalidate=True)
+        except Exception as e:
+            raise ProviderError(str(e)) from e
+
+class LocalStorageProvider(StorageProvider):
+    """Signs uploads with a fixed local secret, using Cloudinary's signing scheme."""
+    name = "local"
+    configured = True
+    cloud_name = "local"
+    api_key = "local"
+
+    def sign_upload(self, params: dict) -> str:
+        to_sign = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+        return hashlib.sha1(f"{to_sign}local-secret".encode()).hexdigest()
+
+    async def destroy(self, public_id: str, resource_type: str = "video"):
+        await simulate_local_call(self.name)
+        logging.info(f"Local storage destroy {resource_type} {public_id}")
+
+def select_provider(env_var: str, default: str, factories: dict):
+    choice = os.environ.get(env_var, default).lower()
+    if choice not in factories:
+        raise RuntimeError(f"Unknown {env_var} '{choice}' - expected one of {', '.join(factories)}")
+    return factories[choice]()
+
+llm_provider: LLMProvider = select_provider('LLM_PROVIDER', 'emergent', {
+    "emergent": lambda: EmergentLLMProvider(os.environ.get('EMERGENT_LLM_KEY')),
+    "local": LocalLLMProvider,
+})
+tts_provider: TTSProvider = select_provider('TTS_PROVIDER', 'elevenlabs', {
+    "elevenlabs": lambda: ElevenLabsTTSProvider(os.environ.get('ELEVENLABS_API_KEY')),
+    "local": LocalTTSProvider,
+})
+email_provider: EmailProvider = select_provider('EMAIL_PROVIDER', 'resend', {
+    "resend": lambda: ResendEmailProvider(os.environ.get('RESEND_API_KEY')),
+    "local": LocalEmailProvider,
+})
+storage_provider: StorageProvider = select_provider('STORAGE_PROVIDER', 'cloudinary', {
+    "cloudinary": CloudinaryStorageProvider,
+    "local": LocalStorageProvider,
+})
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'cuepartner-secret-key-change-in-production')
@@ -221,7 +463,10 @@ class TakeResponse(BaseModel):
     notes: str
     is_favorite: bool
     video_url: str
+    mp4_url: Optional[str] = None
     thumbnail_url: Optional[str] = None
+    storyboard: Optional[dict] = None
+    waveform: Optional[List[float]] = None
     created_at: str
 
 class TakeUpdate(BaseModel):
@@ -233,6 +478,8 @@ class TakeUpdate(BaseModel):
 class MembershipTier(BaseModel):
     tier: str  # free, pro
     cloud_storage_mb: int  # storage limit in MB
+    storage_mb: int  # takes and audio kept on our servers
+    takes_per_project: Optional[int] = None  # None = unlimited
     features: List[str]
 
 class UserMembership(BaseModel):
@@ -277,11 +524,29 @@ class DirectSubmissionRequest(BaseModel):
     recipient_name: str
     message: Optional[str] = ""
 
+MAX_BULK_RECIPIENTS = 20
+
+class BulkSubmissionRequest(BaseModel):
+    recipients: List[DirectSubmissionRequest] = Field(min_length=1, max_length=MAX_BULK_RECIPIENTS)
+    message: Optional[str] = ""  # used for recipients without their own message
+
+class BulkSubmissionResult(BaseModel):
+    recipient_email: str
+    recipient_name: str
+    share_url: str
+
 class DirectSubmissionResponse(BaseModel):
     status: str
     message: str
     share_url: str
     email_sent: bool
+    email_queued: bool = False
+
+class BulkSubmissionResponse(BaseModel):
+    status: str
+    message: str
+    submissions: List[BulkSubmissionResult]
+    email_queued: bool
 
 class PasteScriptRequest(BaseModel):
     script_text: str
@@ -413,9 +678,6 @@ async def parse_script_pdf_async(pdf_content: bytes) -> tuple[List[Scene], List[
 
 async def parse_script_with_ai_async(script_text: str) -> tuple[list, set]:
     """Use GPT to intelligently parse any script format."""
-    # Use the correct import path from emergentintegrations
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
-    
     logging.info(f"Starting AI parsing with text length: {len(script_text)}")
     
     # Truncate if too long
@@ -451,19 +713,12 @@ Important:
 - Remove parenthetical stage directions from dialogue text
 - Return valid JSON only, no markdown or explanation"""
 
-    api_key = os.environ.get("EMERGENT_LLM_KEY")
-    if not api_key:
-        logging.error("EMERGENT_LLM_KEY not configured")
-        raise ValueError("EMERGENT_LLM_KEY not configured")
-    
-    logging.info("Calling GPT-5.2 for script parsing...")
-    session_id = f"script-parse-{uuid.uuid4()}"
-    chat = LlmChat(api_key=api_key, session_id=session_id, system_message=system_message)
-    chat = chat.with_model("openai", "gpt-5.2")
+    if not llm_provider.configured:
+        logging.error("LLM provider not configured")
+        raise ValueError("LLM provider not configured")
     
-    # Create proper UserMessage object
-    user_message = UserMessage(text=prompt)
-    response = await chat.send_message(user_message)
+    logging.info(f"Calling {llm_provider.name} LLM for script parsing...")
+    response = await llm_provider.complete(system_message, prompt)
     
     logging.info(f"Received AI response, length: {len(response) if response else 0}")
     
@@ -974,8 +1229,8 @@ def parse_script_text(script_text: str) -> tuple[List[Scene], List[str]]:
 
 async def analyze_script_with_ai(scenes: List[Scene], characters: List[str]) -> tuple[List[CharacterAnalysis], List[Scene]]:
     """Use GPT-5.2 to analyze characters and emotions in the script."""
-    if not EMERGENT_LLM_KEY:
-        logging.warning("No EMERGENT_LLM_KEY - skipping AI analysis")
+    if not llm_provider.configured:
+        logging.warning("No LLM provider configured - skipping AI analysis")
         return [], scenes
     
     # Prepare script text for analysis
@@ -985,13 +1240,8 @@ async def analyze_script_with_ai(scenes: List[Scene], characters: List[str]) ->
             script_text += f"{line.character}: {line.text}\n"
     
     # Analyze characters
-    chat = LlmChat(
-        api_key=EMERGENT_LLM_KEY,
-        session_id=f"char-analysis-{uuid.uuid4()}",
-        system_message="""You are a script analyst specializing in character and emotion analysis for actors. 
+    character_system_message = """You are a script analyst specializing in character and emotion analysis for actors. 
         Analyze scripts to identify character traits and emotional context of dialogue."""
-    )
-    chat.with_model("openai", "gpt-5.2")
     
     character_prompt = f"""Analyze these characters from the script and provide details for casting/voice selection.
 
@@ -1009,7 +1259,7 @@ Return ONLY valid JSON array:
 [{{"name": "Character Name", "gender": "male", "age_group": "adult", "voice_type": "description"}}]"""
 
     try:
-        char_response = await chat.send_message(UserMessage(text=character_prompt))
+        char_response = await llm_provider.complete(character_system_message, character_prompt)
         
         # Parse character analysis
         json_match = re.search(r'\[[\s\S]*\]', char_response)
@@ -1023,13 +1273,8 @@ Return ONLY valid JSON array:
         character_analysis = []
     
     # Analyze emotions for each line
-    emotion_chat = LlmChat(
-        api_key=EMERGENT_LLM_KEY,
-        session_id=f"emotion-analysis-{uuid.uuid4()}",
-        system_message="""You are an acting coach analyzing script dialogue for emotional delivery.
+    emotion_system_message = """You are an acting coach analyzing script dialogue for emotional delivery.
         Identify the emotion, intensity, and any direction for how lines should be performed."""
-    )
-    emotion_chat.with_model("openai", "gpt-5.2")
     
     # Process lines in batches
     updated_scenes = []
@@ -1056,7 +1301,7 @@ Return ONLY valid JSON array with line numbers:
 [{{"line": 1, "emotion": "angry", "intensity": "high", "direction": "building rage"}}]"""
 
             try:
-                emotion_response = await emotion_chat.send_message(UserMessage(text=emotion_prompt))
+                emotion_response = await llm_provider.complete(emotion_system_message, emotion_prompt)
                 
                 json_match = re.search(r'\[[\s\S]*\]', emotion_response)
                 if json_match:
@@ -1146,6 +1391,704 @@ def get_voice_for_character(char_analysis: Optional[CharacterAnalysis]) -> str:
     key = (char_analysis.gender.lower(), char_analysis.age_group.lower())
     return VOICE_MAPPING.get(key, "21m00Tcm4TlvDq8ikWAM")
 
+# ============== TTS SCHEDULING ==============
+# Provider limits are shared by every uvicorn worker, so the pacing state is
+# kept in Mongo (`provider_quota`): one document per provider holding the
+# active call leases, plus one counter document per minute of characters sent.
+
+TTS_MAX_CONCURRENCY = int(os.environ.get('TTS_MAX_CONCURRENCY', '3'))
+TTS_INTERACTIVE_RESERVED_SLOTS = int(os.environ.get('TTS_INTERACTIVE_RESERVED_SLOTS', '1'))
+TTS_CHARS_PER_MINUTE = int(os.environ.get('TTS_CHARS_PER_MINUTE', '0'))  # 0 = no character pacing
+TTS_MAX_RETRIES = int(os.environ.get('TTS_MAX_RETRIES', '5'))
+TTS_BACKOFF_BASE_SECONDS = 0.5
+TTS_BACKOFF_MAX_SECONDS = 30
+TTS_LEASE_SECONDS = 120  # Leases of crashed workers free themselves after this
+TTS_ACQUIRE_TIMEOUT_SECONDS = {"interactive": 60, "bulk": 600}
+
+TTSPriority = Literal["interactive", "bulk"]
+
+def is_retryable_provider_error(error: ProviderError) -> bool:
+    # No status means a transport-level failure, which is worth retrying too
+    return error.status_code is None or error.status_code == 429 or error.status_code >= 500
+
+class TTSQuotaScheduler:
+    """Paces TTS calls against the provider's concurrency and character quotas.
+
+    Interactive requests may use every concurrency slot, while bulk jobs leave
+    TTS_INTERACTIVE_RESERVED_SLOTS free, so a single-line request never
+    queues behind a whole script being voiced.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.initialized = False
+
+    async def acquire(self, chars: int, priority: TTSPriority) -> str:
+        """Wait for a free slot (and character budget) and return its lease id."""
+        if not self.initialized:
+            await db.provider_quota.update_one(
+                {"_id": self.provider},
+                {"$setOnInsert": {"leases": [], "paused_until": None}},
+                upsert=True
+            )
+            self.initialized = True
+        
+        limit = TTS_MAX_CONCURRENCY
+        if priority == "bulk":
+            limit = max(1, TTS_MAX_CONCURRENCY - TTS_INTERACTIVE_RESERVED_SLOTS)
+        poll_seconds = 0.05 if priority == "interactive" else 0.25
+        deadline = time.monotonic() + TTS_ACQUIRE_TIMEOUT_SECONDS[priority]
+        lease_id = str(uuid.uuid4())
+        
+        while True:
+            now = datetime.now(timezone.utc)
+            # Free slots held by workers that died mid-call
+            await db.provider_quota.update_one(
+                {"_id": self.provider},
+                {"$pull": {"leases": {"expires_at": {"$lt": now}}}}
+            )
+            # Taking a slot only succeeds while fewer than `limit` leases exist
+            result = await db.provider_quota.update_one(
+                {
+                    "_id": self.provider,
+                    f"leases.{limit - 1}": {"$exists": False},
+                    "$or": [{"paused_until": None}, {"paused_until": {"$lte": now}}]
+                },
+                {"$push": {"leases": {
+                    "id": lease_id,
+                    "priority": priority,
+                    "expires_at": now + timedelta(seconds=TTS_LEASE_SECONDS)
+                }}}
+            )
+            if result.modified_count:
+                if await self.reserve_chars(chars, now):
+                    return lease_id
+                await self.release(lease_id)
+            
+            if time.monotonic() > deadline:
+                raise ProviderError("TTS provider is busy, please try again", status_code=503)
+            await asyncio.sleep(poll_seconds * random.uniform(1, 2))
+
+    async def reserve_chars(self, chars: int, now: datetime) -> bool:
+        """Count characters against the current minute's budget."""
+        if TTS_CHARS_PER_MINUTE <= 0:
+            return True
+        window = now.replace(second=0, microsecond=0)
+        try:
+            await db.provider_quota.update_one(
+                # A line longer than the whole budget may still go into an empty window
+                {"_id": f"{self.provider}:chars:{window.isoformat()}", "chars": {"$lte": max(0, TTS_CHARS_PER_MINUTE - chars)}},
+                {"$inc": {"chars": chars}, "$setOnInsert": {"expires_at": window + timedelta(minutes=2)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The window exists but has no room left
+            return False
+
+    async def release(self, lease_id: str):
+        await db.provider_quota.update_one(
+            {"_id": self.provider},
+            {"$pull": {"leases": {"id": lease_id}}}
+        )
+
+    async def pause(self, seconds: float):
+        """Make every worker hold off after the provider pushed back."""
+        await db.provider_quota.update_one(
+            {"_id": self.provider},
+            {"$max": {"paused_until": datetime.now(timezone.utc) + timedelta(seconds=seconds)}}
+        )
+
+tts_scheduler = TTSQuotaScheduler(tts_provider.name)
+
+async def synthesize_speech(text: str, voice_id: str, voice_settings: VoiceSettings, priority: TTSPriority = "bulk") -> bytes:
+    """Call the TTS provider within its quotas, retrying transient failures.
+
+    Rate limiting (429) and server errors are retried with jittered
+    exponential backoff; a 429 also pauses the provider for all workers.
+    """
+    for attempt in range(TTS_MAX_RETRIES + 1):
+        lease_id = await tts_scheduler.acquire(len(text), priority)
+        try:
+            return await tts_provider.synthesize(text, voice_id, voice_settings)
+        except ProviderError as e:
+            if attempt == TTS_MAX_RETRIES or not is_retryable_provider_error(e):
+                raise
+            delay = random.uniform(0, min(TTS_BACKOFF_MAX_SECONDS, TTS_BACKOFF_BASE_SECONDS * 2 ** attempt))
+            if e.status_code == 429:
+                await tts_scheduler.pause(delay)
+            logging.warning(f"TTS attempt {attempt + 1} failed ({e.status_code}): {e} - retrying in {delay:.1f}s")
+        finally:
+            await tts_scheduler.release(lease_id)
+        await asyncio.sleep(delay)
+
+async def set_line_fields(project_id: str, line: dict, fields: dict) -> bool:
+    """Atomically set fields on a single script line.
+
+    Uses an array-filter update so only the touched line goes over the wire,
+    instead of rewriting the whole scenes array. The filter also matches the
+    line text, so audio synthesized for a line the editor has since changed is
+    dropped rather than attached to the new text. Returns True if a line was
+    updated.
+    """
+    update = {f"scenes.$[].lines.$[target].{key}": value for key, value in fields.items()}
+    update["updated_at"] = datetime.now(timezone.utc).isoformat()
+    result = await db.projects.update_one(
+        {"id": project_id},
+        {"$set": update},
+        array_filters=[{"target.id": line["id"], "target.text": line["text"]}]
+    )
+    return result.modified_count > 0
+
+def audio_fingerprint(text: str, voice_id: str, voice_settings: VoiceSettings) -> str:
+    """Fingerprint the inputs a line's audio is generated from.
+
+    Lines whose stored fingerprint matches don't need to be voiced again.
+    """
+    payload = json.dumps({
+        "text": text,
+        "voice_id": voice_id,
+        "provider": tts_provider.name,
+        "model_id": ELEVENLABS_MODEL_ID,
+        "voice_settings": voice_settings.model_dump(exclude_none=True)
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def released_audio_bytes(urls: set, remaining_lines: List[dict]) -> int:
+    """Size of the audio blobs among urls that none of remaining_lines still use."""
+    still_used = {url for line in remaining_lines for url in audio_urls(line)}
+    return sum(blob_size(audio_blob_key(url)) for url in urls - still_used)
+
+def project_lines(project: dict) -> List[dict]:
+    return [line for scene in project.get("scenes", []) for line in scene.get("lines", [])]
+
+async def save_line_audio(
+    project_id: str,
+    user_id: str,
+    line: dict,
+    fields: dict,
+    new_bytes: int,
+    all_lines: List[dict]
+) -> bool:
+    """Store generated audio on a line and settle the owner's storage usage.
+
+    Only blobs written by this generation are charged, and only once the
+    line update lands. Audio it replaces is refunded unless another line of
+    the project still uses it.
+    """
+    replaced = set(audio_urls(line)) - set(audio_urls(fields))
+    if not await set_line_fields(project_id, line, fields):
+        return False
+    others = [other for other in all_lines if other.get("id") != line["id"]]
+    await charge_storage(user_id, new_bytes - released_audio_bytes(replaced, others))
+    return True
+
+def get_line_voice_settings(line: dict) -> VoiceSettings:
+    emotion = LineEmotion(**line["emotion"]) if line.get("emotion") else None
+    return get_voice_settings_for_emotion(emotion)
+
+async def synthesize_line_audio(
+    project: dict,
+    line: dict,
+    voice_id: Optional[str] = None,
+    priority: TTSPriority = "bulk"
+) -> tuple[dict, int]:
+    """Generate TTS audio for a line using the project's character analysis.
+
+    Returns the line fields to store (the content-addressed URL of the audio,
+    its compact renditions and the fingerprint of the inputs it was generated
+    from) and the number of bytes newly written to the blob store.
+    """
+    if voice_id is None:
+        # Get character analysis for voice selection
+        char_analysis = None
+        for ca in project.get("character_analysis", []):
+            if ca["name"] == line["character"]:
+                char_analysis = CharacterAnalysis(**ca)
+                break
+        voice_id = get_voice_for_character(char_analysis)
+    
+    voice_settings = get_line_voice_settings(line)
+    audio_data = await synthesize_speech(line["text"], voice_id, voice_settings, priority)
+    audio_url, written = await write_audio_blob(audio_data, ext=tts_provider.audio_format)
+    renditions, renditions_written = await transcode_audio_renditions(audio_data)
+    fields = {
+        "audio_url": audio_url,
+        "audio_renditions": renditions,
+        "audio_fingerprint": audio_fingerprint(line["text"], voice_id, voice_settings)
+    }
+    return fields, written + renditions_written
+
+# ============== BLOB STORAGE ==============
+
+BLOB_DIR = Path(os.environ.get("BLOB_DIR", ROOT_DIR / "blobs")).resolve()
+BLOB_READ_CHUNK = 64 * 1024
+
+AUDIO_MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "webm": "audio/webm",
+}
+
+def blob_path(key: str) -> Path:
+    """Resolve a blob key to a path, refusing keys that escape BLOB_DIR."""
+    path = (BLOB_DIR / key).resolve()
+    if BLOB_DIR not in path.parents:
+        raise ValueError(f"Invalid blob key: {key}")
+    return path
+
+def _write_file_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+async def put_blob(key: str, data: bytes):
+    """Write a blob atomically so readers never see a partial file."""
+    await asyncio.to_thread(_write_file_atomic, blob_path(key), data)
+
+async def write_audio_blob(audio_data: bytes, ext: str = "mp3") -> tuple[str, int]:
+    """Store audio content-addressed by its SHA-256.
+
+    Identical audio is stored once, and since the URL changes whenever the
+    content does it can be cached by browsers forever. Returns the public URL
+    and the number of bytes written (0 when the blob already existed).
+    """
+    digest = hashlib.sha256(audio_data).hexdigest()
+    key = f"audio/{digest[:2]}/{digest}.{ext}"
+    written = 0
+    try:
+        # Reuse counts as a fresh write, so the GC grace period covers it
+        os.utime(blob_path(key))
+    except FileNotFoundError:
+        await put_blob(key, audio_data)
+        written = len(audio_data)
+    return f"/api/audio/{digest}.{ext}", written
+
+async def store_audio_blob(audio_data: bytes, ext: str = "mp3") -> str:
+    return (await write_audio_blob(audio_data, ext))[0]
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Parse a single-range `Range: bytes=...` header into inclusive offsets.
+
+    Returns None when the header is absent or not a single byte range (the
+    whole body is served then). Raises ValueError for unsatisfiable ranges.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[6:].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix == 0:
+                raise ValueError("Empty suffix range")
+            start = max(0, size - suffix)
+            end = size - 1
+    except ValueError:
+        raise ValueError("Malformed range")
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+async def iter_file_range(path: Path, start: int, length: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await f.read(min(BLOB_READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def blob_response(request: Request, path: Path, media_type: str, etag: str, cache_control: str) -> Response:
+    """Serve a file with ETag revalidation and single-range `Range` support."""
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    size = path.stat().st_size
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None  # The client's partial copy is stale - send everything
+    
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+    
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+    
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    
+    return StreamingResponse(
+        iter_file_range(path, start, length),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type
+    )
+
+# ============== MEDIA PROCESSING ==============
+
+# Python maps .ts to Qt translation files
+mimetypes.add_type("video/mp2t", ".ts")
+
+# Compact renditions transcoded from each line's original audio. Opus is far
+# smaller at speech quality; low-bitrate MP3 covers browsers without Opus.
+AUDIO_RENDITIONS = {
+    "opus": {"ext": "webm", "args": ["-c:a", "libopus", "-b:a", "24k", "-ac", "1", "-f", "webm"]},
+    "mp3_low": {"ext": "mp3", "args": ["-c:a", "libmp3lame", "-b:a", "48k", "-ac", "1", "-ar", "22050", "-f", "mp3"]},
+}
+
+@functools.lru_cache(maxsize=1)
+def get_ffmpeg_binary() -> Optional[str]:
+    """Locate ffmpeg: FFMPEG_BINARY, then PATH, then the imageio-ffmpeg bundle."""
+    binary = os.environ.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if binary:
+        return binary
+    try:
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception as e:
+        logging.warning(f"ffmpeg not available - media processing disabled: {e}")
+        return None
+
+async def run_ffmpeg(args: List[str], input_data: Optional[bytes] = None) -> bytes:
+    """Run ffmpeg without blocking the event loop and return its stdout."""
+    binary = get_ffmpeg_binary()
+    if not binary:
+        raise RuntimeError("ffmpeg not available")
+    process = await asyncio.create_subprocess_exec(
+        binary, "-hide_banner", "-loglevel", "error", "-nostdin", *args,
+        stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate(input_data)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace')[-500:]}")
+    return stdout
+
+async def transcode_audio_renditions(audio_data: bytes) -> tuple[Dict[str, str], int]:
+    """Transcode audio into every compact rendition.
+
+    Returns the rendition URLs and the bytes newly written for them. A
+    rendition that fails to transcode is left out; clients then fall back
+    to the original audio.
+    """
+    if not get_ffmpeg_binary():
+        return {}, 0
+    
+    async def transcode(name: str, rendition: dict) -> tuple[str, Optional[str], int]:
+        try:
+            output = await run_ffmpeg(["-i", "pipe:0", "-vn", *rendition["args"], "pipe:1"], audio_data)
+            return name, *await write_audio_blob(output, ext=rendition["ext"])
+        except Exception as e:
+            logging.error(f"Audio rendition {name} failed: {e}")
+            return name, None, 0
+    
+    results = await asyncio.gather(*(transcode(name, r) for name, r in AUDIO_RENDITIONS.items()))
+    return {name: url for name, url, _ in results if url}, sum(written for _, _, written in results)
+
+def audio_blob_key(audio_url: str) -> Optional[str]:
+    """Map an /api/audio URL back to its blob key."""
+    match = re.fullmatch(r"/api/audio/([0-9a-f]{64})\.([a-z0-9]+)", audio_url or "")
+    if not match:
+        return None
+    digest, ext = match.groups()
+    return f"audio/{digest[:2]}/{digest}.{ext}"
+
+def select_audio_format(audio_format: Optional[str], accept: Optional[str]) -> Optional[str]:
+    """Pick a rendition from an explicit audio_format or the Accept header."""
+    if audio_format:
+        return audio_format if audio_format in AUDIO_RENDITIONS else None
+    accept = (accept or "").lower()
+    if "audio/webm" in accept or "audio/ogg" in accept or "opus" in accept:
+        return "opus"
+    return None
+
+def pick_audio_url(line: dict, audio_format: Optional[str]) -> Optional[str]:
+    if audio_format:
+        return (line.get("audio_renditions") or {}).get(audio_format) or line.get("audio_url")
+    return line.get("audio_url")
+
+async def probe_media_codecs(path: Path) -> dict:
+    """Return the first video and audio codec names ffmpeg reports for a file.
+
+    The video frame height is included as "height" when ffmpeg reports it.
+    """
+    binary = get_ffmpeg_binary()
+    if not binary:
+        raise RuntimeError("ffmpeg not available")
+    # ffmpeg with an input and no output prints the stream info and exits non-zero
+    process = await asyncio.create_subprocess_exec(
+        binary, "-hide_banner", "-nostdin", "-i", str(path),
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    info = stderr.decode(errors="replace")
+    codecs = {}
+    for kind, codec in re.findall(r"Stream #\d+:\d+.*?: (Video|Audio): (\w+)", info):
+        codecs.setdefault(kind.lower(), codec)
+    size = re.search(r"Stream #\d+:\d+.*?: Video: .*?, (\d{2,5})x(\d{2,5})", info)
+    if size:
+        codecs["height"] = int(size.group(2))
+    return codecs
+
+# ============== BACKGROUND JOBS ==============
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "900"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "5"))
+JOB_RETRY_BASE_SECONDS = 30
+
+JobHandler = Callable[[dict], Awaitable[Optional[dict]]]
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+job_wakeup = asyncio.Event()
+job_worker_tasks: List[asyncio.Task] = []
+
+def job_handler(kind: str):
+    """Register a coroutine that processes jobs of the given kind."""
+    def register(func: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+async def enqueue_job(kind: str, key: str, payload: dict, restart: bool = False) -> dict:
+    """Queue a job unless one with the same kind and key already exists.
+
+    Jobs are persisted in Mongo, so any worker process can pick them up and
+    they survive restarts. With restart=True a finished or failed job is
+    queued again.
+    """
+    now = datetime.now(timezone.utc)
+    job = await db.jobs.find_one_and_update(
+        {"kind": kind, "key": key},
+        {
+            "$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "kind": kind,
+                "key": key,
+                "payload": payload,
+                "status": "queued",
+                "attempts": 0,
+                "run_at": now,
+                "created_at": now,
+            }
+        },
+        upsert=True,
+        return_document=True,
+        projection={"_id": 0}
+    )
+    if restart and job["status"] in ("done", "failed"):
+        job = await db.jobs.find_one_and_update(
+            {"id": job["id"], "status": job["status"]},
+            {"$set": {"status": "queued", "attempts": 0, "run_at": now, "payload": payload, "error": None}},
+            return_document=True,
+            projection={"_id": 0}
+        ) or job
+    job_wakeup.set()
+    return job
+
+async def get_job(kind: str, key: str) -> Optional[dict]:
+    return await db.jobs.find_one({"kind": kind, "key": key}, {"_id": 0})
+
+async def claim_job() -> Optional[dict]:
+    """Lease the next due job; jobs whose worker died are picked up again.
+
+    Each claim stamps a fresh lease_id, so a worker whose lease ran out
+    can't overwrite the outcome of the worker that took the job over.
+    """
+    now = datetime.now(timezone.utc)
+    return await db.jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "run_at": {"$lte": now}},
+            {"status": "running", "lease_until": {"$lt": now}},
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "lease_id": str(uuid.uuid4()),
+                "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                "started_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_at", 1)],
+        return_document=True,
+        projection={"_id": 0}
+    )
+
+async def run_job(job: dict):
+    handler = JOB_HANDLERS.get(job["kind"])
+    try:
+        if not handler:
+            raise RuntimeError(f"No handler for job kind {job['kind']}")
+        result = await handler(job["payload"])
+    except Exception as e:
+        failed = job["attempts"] >= JOB_MAX_ATTEMPTS
+        logging.error(f"Job {job['kind']}:{job['key']} attempt {job['attempts']} failed: {e}")
+        await db.jobs.update_one(
+            {"id": job["id"], "status": "running", "lease_id": job["lease_id"]},
+            {"$set": {
+                "status": "failed" if failed else "queued",
+                "error": str(e)[:500],
+                "run_at": datetime.now(timezone.utc) + timedelta(seconds=JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)),
+                "lease_until": None
+            }}
+        )
+        return
+    await db.jobs.update_one(
+        {"id": job["id"], "status": "running", "lease_id": job["lease_id"]},
+        {"$set": {
+            "status": "done",
+            "result": result,
+            "error": None,
+            "finished_at": datetime.now(timezone.utc),
+            "lease_until": None
+        }}
+    )
+
+async def job_worker():
+    while True:
+        try:
+            job = await claim_job()
+        except Exception as e:
+            logging.error(f"Job claim failed: {e}")
+            job = None
+        if job:
+            await run_job(job)
+            continue
+        job_wakeup.clear()
+        try:
+            await asyncio.wait_for(job_wakeup.wait(), timeout=JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+# ============== STORAGE ACCOUNTING ==============
+
+MB = 1024 * 1024
+STORAGE_RECONCILE_HOURS = float(os.environ.get("STORAGE_RECONCILE_HOURS", "24"))
+
+def user_tier(user: dict) -> MembershipTier:
+    return MEMBERSHIP_TIERS.get((user.get("membership") or {}).get("tier", "free"), MEMBERSHIP_TIERS["free"])
+
+def check_storage_quota(user: dict, incoming_bytes: int):
+    """Fail fast using the already-loaded user document."""
+    if user.get("storage_used_bytes", 0) + incoming_bytes > user_tier(user).storage_mb * MB:
+        raise HTTPException(status_code=413, detail="Storage quota exceeded")
+
+async def check_take_limit(user: dict, project_id: str):
+    limit = user_tier(user).takes_per_project
+    if limit is not None and await db.takes.count_documents({"project_id": project_id, "user_id": user["id"]}, limit=limit) >= limit:
+        raise HTTPException(status_code=403, detail=f"Your plan allows {limit} takes per project")
+
+async def reserve_storage(user: dict, nbytes: int) -> bool:
+    """Charge bytes to a user only if they still fit in their quota.
+
+    The check and the increment are a single conditional update, so
+    concurrent uploads cannot overshoot the quota together.
+    """
+    headroom = user_tier(user).storage_mb * MB - nbytes
+    if headroom < 0:
+        return False
+    result = await db.users.update_one(
+        {"id": user["id"], "$or": [
+            {"storage_used_bytes": {"$lte": headroom}},
+            {"storage_used_bytes": {"$exists": False}},
+        ]},
+        {"$inc": {"storage_used_bytes": nbytes}}
+    )
+    return result.modified_count == 1
+
+async def charge_storage(user_id: str, nbytes: int, take_id: Optional[str] = None):
+    """Adjust a user's stored bytes (and the take's share of them) without a quota check."""
+    if not nbytes:
+        return
+    await db.users.update_one({"id": user_id}, {"$inc": {"storage_used_bytes": nbytes}})
+    if take_id:
+        await db.takes.update_one({"id": take_id}, {"$inc": {"storage_bytes": nbytes}})
+
+def blob_size(key: Optional[str]) -> int:
+    try:
+        return blob_path(key).stat().st_size if key else 0
+    except (OSError, ValueError):
+        return 0
+
+def take_dir_size(take_id: str) -> int:
+    take_dir = blob_path(f"takes/{take_id}")
+    if not take_dir.is_dir():
+        return 0
+    return sum(f.stat().st_size for f in take_dir.rglob("*") if f.is_file() and not f.name.startswith("."))
+
+def audio_urls(line: dict) -> List[str]:
+    return [url for url in [line.get("audio_url"), *(line.get("audio_renditions") or {}).values()] if url]
+
+@job_handler("storage_reconcile")
+async def reconcile_user_storage(payload: dict) -> dict:
+    """Recompute a user's stored bytes exactly from the blob store.
+
+    Incremental charges can drift (shared audio, regenerated lines, jobs
+    racing deletes); this resets both take and user totals.
+    """
+    user_id = payload["user_id"]
+    takes_bytes = 0
+    async for take in db.takes.find({"user_id": user_id}, {"_id": 0, "id": 1, "storage_bytes": 1}):
+        size = await asyncio.to_thread(take_dir_size, take["id"])
+        takes_bytes += size
+        if take.get("storage_bytes") != size:
+            await db.takes.update_one({"id": take["id"]}, {"$set": {"storage_bytes": size}})
+    
+    audio_keys = set()
+    async for project in db.projects.find({"user_id": user_id}, {"_id": 0, "scenes.lines.audio_url": 1, "scenes.lines.audio_renditions": 1}):
+        for scene in project.get("scenes", []):
+            for line in scene.get("lines", []):
+                audio_keys.update(filter(None, map(audio_blob_key, audio_urls(line))))
+    audio_bytes = await asyncio.to_thread(lambda: sum(map(blob_size, audio_keys)))
+    
+    await db.users.update_one({"id": user_id}, {"$set": {"storage_used_bytes": takes_bytes + audio_bytes}})
+    return {"takes_bytes": takes_bytes, "audio_bytes": audio_bytes}
+
+async def storage_reconcile_loop():
+    while True:
+        try:
+            async for user in db.users.find({}, {"_id": 0, "id": 1}):
+                await enqueue_job("storage_reconcile", user["id"], {"user_id": user["id"]}, restart=True)
+        except Exception as e:
+            logging.error(f"Scheduling storage reconciliation failed: {e}")
+        await asyncio.sleep(STORAGE_RECONCILE_HOURS * 3600)
+
 # ============== AUTH ROUTES ==============
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -1273,6 +2216,8 @@ async def delete_project(project_id: str, current_user: dict = Depends(get_curre
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Project not found")
     
+    # Takes, shares, uploads and their files are removed in the background
+    await enqueue_job("project_cleanup", project_id, {"project_id": project_id})
     return {"message": "Project deleted"}
 
 # ============== SCRIPT EDITOR ==============
@@ -1291,65 +2236,118 @@ class UpdateScriptRequest(BaseModel):
     lines: List[ScriptLine]
     characters: List[str]
 
+# Fields the editor owns; everything else on a stored line (audio, renditions,
+# fingerprints) is kept across saves
+EDITOR_LINE_FIELDS = ("character", "text", "line_number", "is_user_line", "emotion", "parenthetical")
+LINE_AUDIO_FIELDS = ("audio_url", "audio_renditions", "audio_fingerprint", "audio_renditions_failed")
+SCRIPT_SAVE_ATTEMPTS = 3
+
+def merge_edited_line(edit: ScriptLine, stored: Optional[dict], user_character: Optional[str]) -> dict:
+    """Apply an editor line over its stored version.
+
+    Audio is kept unless the text changed; voice or emotion changes show up
+    as a fingerprint mismatch and are regenerated from there.
+    """
+    line = {
+        **(stored or {}),
+        "id": edit.id or str(uuid.uuid4()),
+        "character": edit.character,
+        "text": edit.text,
+        "line_number": edit.line_number,
+        "is_user_line": edit.character == user_character,
+        "emotion": edit.emotion,
+        "parenthetical": edit.parenthetical
+    }
+    if not stored or stored.get("text") != edit.text:
+        for key in LINE_AUDIO_FIELDS:
+            line.pop(key, None)
+        line["audio_url"] = None  # Will need regeneration
+    return line
+
 @api_router.put("/projects/{project_id}/script", response_model=ProjectResponse)
 async def update_script(
     project_id: str,
     request: UpdateScriptRequest,
     current_user: dict = Depends(get_current_user)
 ):
-    """Update script lines and characters - used by the script editor"""
-    project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]})
+    """Update script lines and characters - used by the script editor.
+
+    Only lines the editor changed are written, so audio that a generation
+    stores concurrently on the other lines survives the save.
+    """
+    project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]}, {"_id": 0})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Convert lines to scene structure
-    lines_data = []
-    for line in request.lines:
-        line_dict = {
-            "id": line.id or str(uuid.uuid4()),
-            "character": line.character,
-            "text": line.text,
-            "line_number": line.line_number,
-            "is_user_line": line.character == project.get("user_character"),
-            "emotion": line.emotion,
-            "audio_url": None,  # Clear audio - will need regeneration
-            "parenthetical": line.parenthetical
+    for _ in range(SCRIPT_SAVE_ATTEMPTS):
+        stored_lines = project_lines(project)
+        stored = {line["id"]: line for line in stored_lines}
+        lines = [merge_edited_line(edit, stored.get(edit.id), project.get("user_character")) for edit in request.lines]
+        
+        # Update character analysis if characters changed
+        existing_analysis = project.get("character_analysis", [])
+        updated_analysis = []
+        for char in request.characters:
+            # Keep existing analysis if available
+            existing = next((a for a in existing_analysis if a.get("name") == char), None)
+            if existing:
+                updated_analysis.append(existing)
+            else:
+                # Add placeholder for new characters
+                updated_analysis.append({
+                    "name": char,
+                    "voice_id": None,
+                    "gender": "unknown",
+                    "age": "adult",
+                    "description": f"Character {char}"
+                })
+        
+        update_data = {
+            "characters": request.characters,
+            "character_analysis": updated_analysis,
+            "updated_at": datetime.now(timezone.utc).isoformat()
         }
-        lines_data.append(line_dict)
-    
-    # Create single scene with all lines
-    scene = {
-        "id": str(uuid.uuid4()),
-        "name": "Main Scene",
-        "lines": lines_data
-    }
-    
-    # Update character analysis if characters changed
-    existing_analysis = project.get("character_analysis", [])
-    updated_analysis = []
-    for char in request.characters:
-        # Keep existing analysis if available
-        existing = next((a for a in existing_analysis if a.get("name") == char), None)
-        if existing:
-            updated_analysis.append(existing)
-        else:
-            # Add placeholder for new characters
-            updated_analysis.append({
-                "name": char,
-                "voice_id": None,
-                "gender": "unknown",
-                "age": "adult",
-                "description": f"Character {char}"
-            })
-    
-    update_data = {
-        "scenes": [scene],
-        "characters": request.characters,
-        "character_analysis": updated_analysis,
-        "updated_at": datetime.now(timezone.utc).isoformat()
-    }
+        
+        if [line["id"] for line in lines] == [line["id"] for line in stored_lines]:
+            # Same lines in the same order: set only the changed lines, by id
+            unset, array_filters = {}, []
+            for line in lines:
+                before = stored[line["id"]]
+                if all(line[key] == before.get(key) for key in EDITOR_LINE_FIELDS):
+                    continue
+                name = f"line{len(array_filters)}"
+                path = f"scenes.$[].lines.$[{name}]"
+                update_data.update({f"{path}.{key}": line[key] for key in EDITOR_LINE_FIELDS})
+                if line["text"] != before.get("text"):
+                    update_data[f"{path}.audio_url"] = None
+                    unset.update({f"{path}.{key}": "" for key in LINE_AUDIO_FIELDS if key != "audio_url"})
+                array_filters.append({f"{name}.id": line["id"]})
+            update = {"$set": update_data, **({"$unset": unset} if unset else {})}
+            await db.projects.update_one({"id": project_id}, update, array_filters=array_filters or None)
+            break
+        
+        # Lines were added, removed or reordered, so the scene is rewritten -
+        # but only if nothing (e.g. a line generation) wrote since it was read
+        scene = {
+            "id": str(uuid.uuid4()),
+            "name": "Main Scene",
+            "lines": lines
+        }
+        result = await db.projects.update_one(
+            {"id": project_id, "updated_at": project.get("updated_at")},
+            {"$set": {**update_data, "scenes": [scene]}}
+        )
+        if result.modified_count:
+            break
+        project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]}, {"_id": 0})
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+    else:
+        raise HTTPException(status_code=409, detail="Script changed while saving, please try again")
     
-    await db.projects.update_one({"id": project_id}, {"$set": update_data})
+    # Audio dropped from edited or deleted lines no longer counts against the user
+    dropped = {url for line in stored_lines for url in audio_urls(line)}
+    await charge_storage(current_user["id"], -released_audio_bytes(dropped, lines))
     
     updated = await db.projects.find_one({"id": project_id}, {"_id": 0})
     return ProjectResponse(**updated)
@@ -1607,8 +2605,65 @@ async def set_user_character(
 
 # ============== READER DATA ==============
 
+async def migrate_inline_audio(project: dict):
+    """Move legacy base64 line audio into the blob store.
+
+    Older projects embed every cue as a data URL, which forces the whole
+    script's audio into each reader-data response. Lines are rewritten in
+    place (and persisted) to point at cacheable audio URLs instead.
+    """
+    for scene in project.get("scenes", []):
+        for line in scene.get("lines", []):
+            audio_url = line.get("audio_url")
+            if not audio_url or not audio_url.startswith("data:"):
+                continue
+            try:
+                _, encoded = audio_url.split(",", 1)
+                line["audio_url"] = await store_audio_blob(base64.b64decode(encoded))
+                await set_line_fields(project["id"], line, {"audio_url": line["audio_url"]})
+            except Exception as e:
+                logging.error(f"Failed to migrate inline audio for line {line.get('id')}: {e}")
+
+# Running backfills by project; holding the task keeps it from being garbage collected
+rendition_backfills: Dict[str, asyncio.Task] = {}
+
+def needs_rendition_backfill(line: dict) -> bool:
+    return bool(
+        line.get("audio_url")
+        and not line.get("audio_renditions")
+        and line.get("audio_renditions_failed") != line["audio_url"]
+    )
+
+async def backfill_audio_renditions(project_id: str, user_id: str, lines: List[dict]):
+    """Transcode compact renditions for lines voiced before renditions existed.
+
+    Audio that can't be transcoded is marked so it isn't retried on every
+    open; regenerating the line's audio clears the mark.
+    """
+    try:
+        for line in lines:
+            key = audio_blob_key(line["audio_url"])
+            renditions, written = {}, 0
+            if key and blob_path(key).exists():
+                audio_data = await asyncio.to_thread(blob_path(key).read_bytes)
+                renditions, written = await transcode_audio_renditions(audio_data)
+            if not renditions:
+                await set_line_fields(project_id, line, {"audio_renditions": {}, "audio_renditions_failed": line["audio_url"]})
+            elif await set_line_fields(project_id, line, {"audio_renditions": renditions}):
+                await charge_storage(user_id, written)
+    except Exception as e:
+        logging.error(f"Rendition backfill failed for project {project_id}: {e}")
+    finally:
+        rendition_backfills.pop(project_id, None)
+
 @api_router.get("/projects/{project_id}/reader-data", response_model=ReaderData)
-async def get_reader_data(project_id: str, current_user: dict = Depends(get_current_user)):
+async def get_reader_data(
+    project_id: str,
+    request: Request,
+    audio_format: Optional[str] = Query(None, description="Preferred audio rendition, e.g. opus or mp3_low"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Script data for the reader, with each cue's audio in the client's preferred rendition."""
     project = await db.projects.find_one(
         {"id": project_id, "user_id": current_user["id"]},
         {"_id": 0}
@@ -1616,6 +2671,19 @@ async def get_reader_data(project_id: str, current_user: dict = Depends(get_curr
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
+    await migrate_inline_audio(project)
+    
+    lines = [line for scene in project.get("scenes", []) for line in scene.get("lines", [])]
+    missing = [line for line in lines if needs_rendition_backfill(line)]
+    if missing and project_id not in rendition_backfills and get_ffmpeg_binary():
+        rendition_backfills[project_id] = asyncio.create_task(
+            backfill_audio_renditions(project_id, current_user["id"], missing)
+        )
+    
+    selected_format = select_audio_format(audio_format, request.headers.get("accept"))
+    for line in lines:
+        line["audio_url"] = pick_audio_url(line, selected_format)
+    
     return ReaderData(
         project_id=project["id"],
         project_title=project["title"],
@@ -1634,10 +2702,13 @@ async def generate_line_audio(
     current_user: dict = Depends(get_current_user)
 ):
     """Generate TTS audio for a specific line with emotional delivery."""
-    if not eleven_client:
+    if not tts_provider.configured:
         raise HTTPException(status_code=503, detail="ElevenLabs not configured. Please add ELEVENLABS_API_KEY.")
     
-    project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]})
+    project = await db.projects.find_one(
+        {"id": project_id, "user_id": current_user["id"]},
+        {"_id": 0}  # Existing audio is needed to refund what a regeneration replaces
+    )
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
@@ -1654,49 +2725,13 @@ async def generate_line_audio(
     if not target_line:
         raise HTTPException(status_code=404, detail="Line not found")
     
-    # Get character analysis for voice selection
-    char_analysis = None
-    for ca in project.get("character_analysis", []):
-        if ca["name"] == target_line["character"]:
-            char_analysis = CharacterAnalysis(**ca)
-            break
-    
-    # Get voice and settings
-    voice_id = get_voice_for_character(char_analysis)
-    emotion = LineEmotion(**target_line["emotion"]) if target_line.get("emotion") else None
-    voice_settings = get_voice_settings_for_emotion(emotion)
-    
     try:
-        # Generate audio
-        audio_generator = eleven_client.text_to_speech.convert(
-            text=target_line["text"],
-            voice_id=voice_id,
-            model_id="eleven_multilingual_v2",
-            voice_settings=voice_settings
-        )
-        
-        # Collect audio data
-        audio_data = b""
-        for chunk in audio_generator:
-            audio_data += chunk
-        
-        # Convert to base64
-        audio_b64 = base64.b64encode(audio_data).decode()
-        audio_url = f"data:audio/mpeg;base64,{audio_b64}"
-        
-        # Update line with audio URL
-        for scene in project.get("scenes", []):
-            for line in scene.get("lines", []):
-                if line["id"] == line_id:
-                    line["audio_url"] = audio_url
-                    break
+        audio_fields, new_bytes = await synthesize_line_audio(project, target_line, priority="interactive")
         
-        await db.projects.update_one(
-            {"id": project_id},
-            {"$set": {"scenes": project["scenes"], "updated_at": datetime.now(timezone.utc).isoformat()}}
-        )
+        # Update only this line - concurrent generations and editor saves stay intact
+        await save_line_audio(project_id, current_user["id"], target_line, audio_fields, new_bytes, project_lines(project))
         
-        return TTSResponse(audio_url=audio_url, line_id=line_id)
+        return TTSResponse(audio_url=audio_fields["audio_url"], line_id=line_id)
         
     except Exception as e:
         logging.error(f"TTS generation error: {e}")
@@ -1708,7 +2743,7 @@ async def generate_all_cue_audio(
     current_user: dict = Depends(get_current_user)
 ):
     """Generate TTS audio for all non-user lines (cue lines)."""
-    if not eleven_client:
+    if not tts_provider.configured:
         raise HTTPException(status_code=503, detail="ElevenLabs not configured")
     
     project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]})
@@ -1728,81 +2763,262 @@ async def generate_all_cue_audio(
             if line.get("audio_url"):
                 continue
             
-            # Get character analysis
-            char_analysis = None
-            for ca in project.get("character_analysis", []):
-                if ca["name"] == line["character"]:
-                    char_analysis = CharacterAnalysis(**ca)
-                    break
-            
-            voice_id = get_voice_for_character(char_analysis)
-            emotion = LineEmotion(**line["emotion"]) if line.get("emotion") else None
-            voice_settings = get_voice_settings_for_emotion(emotion)
-            
             try:
-                audio_generator = eleven_client.text_to_speech.convert(
-                    text=line["text"],
-                    voice_id=voice_id,
-                    model_id="eleven_multilingual_v2",
-                    voice_settings=voice_settings
-                )
-                
-                audio_data = b""
-                for chunk in audio_generator:
-                    audio_data += chunk
-                
-                audio_b64 = base64.b64encode(audio_data).decode()
-                line["audio_url"] = f"data:audio/mpeg;base64,{audio_b64}"
-                generated_count += 1
+                audio_fields, new_bytes = await synthesize_line_audio(project, line)
+                # Save each line as it is generated so progress survives failures
+                if await save_line_audio(project_id, current_user["id"], line, audio_fields, new_bytes, project_lines(project)):
+                    generated_count += 1
                 
             except Exception as e:
                 errors.append(f"Line {line['id']}: {str(e)}")
     
-    # Save updated project
-    await db.projects.update_one(
-        {"id": project_id},
-        {"$set": {"scenes": project["scenes"], "updated_at": datetime.now(timezone.utc).isoformat()}}
-    )
-    
     # Return updated project
     updated = await db.projects.find_one({"id": project_id}, {"_id": 0})
     return ProjectResponse(**updated)
 
 
-# ============== VOICE PREVIEW & MANUAL SELECTION ==============
+@api_router.api_route("/audio/{filename}", methods=["GET", "HEAD"])
+async def get_audio(filename: str, request: Request):
+    """Serve stored line audio by content hash (public, immutable)."""
+    match = re.fullmatch(r"([0-9a-f]{64})\.([a-z0-9]+)", filename)
+    if not match or match.group(2) not in AUDIO_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    digest, ext = match.groups()
+    return blob_response(
+        request,
+        blob_path(f"audio/{digest[:2]}/{digest}.{ext}"),
+        media_type=AUDIO_MEDIA_TYPES[ext],
+        etag=f'"{digest}"',
+        cache_control="public, max-age=31536000, immutable"
+    )
 
-class VoicePreviewRequest(BaseModel):
-    voice_id: str
-    text: str
+# ============== REHEARSAL LOOK-AHEAD ==============
 
-class VoiceConfigItem(BaseModel):
-    voice_id: str
-    gender: str
-    age_group: str
+CUE_LOOKAHEAD_LINES = int(os.environ.get("CUE_LOOKAHEAD_LINES", "4"))
+CUE_LOOKAHEAD_CONCURRENCY = int(os.environ.get("CUE_LOOKAHEAD_CONCURRENCY", "2"))
+CUE_LOOKAHEAD_IDLE_SECONDS = 600  # Drop a session after 10 minutes without position updates
+CUE_CLAIM_SECONDS = 60  # How long a worker owns a line it is generating
 
-class ManualVoiceRequest(BaseModel):
-    voice_config: Dict[str, VoiceConfigItem]
+class RehearsalPositionRequest(BaseModel):
+    line_id: Optional[str] = None
+    line_index: int = 0
+    lookahead: int = Field(default=CUE_LOOKAHEAD_LINES, ge=0, le=20)
+    audio_format: Optional[str] = None
 
-@api_router.post("/voice-preview")
-async def preview_voice(
-    request: VoicePreviewRequest,
-    current_user: dict = Depends(get_current_user)
-):
-    """Generate a voice preview for the given voice ID and text."""
-    try:
-        audio_generator = eleven_client.text_to_speech.convert(
-            text=request.text[:200],  # Limit preview length
-            voice_id=request.voice_id,
-            model_id="eleven_multilingual_v2",
-            voice_settings=VoiceSettings(stability=0.5, similarity_boost=0.75, style=0.5, use_speaker_boost=True)
-        )
+async def claim_line_generation(project_id: str, line: dict) -> bool:
+    """Mark a line as being generated so other workers don't voice it too.
+
+    The claim only succeeds if the line still has no audio and nobody else
+    holds an unexpired claim on it.
+    """
+    now = datetime.now(timezone.utc)
+    result = await db.projects.update_one(
+        {"id": project_id},
+        {"$set": {
+            "scenes.$[].lines.$[target].audio_pending_until": (now + timedelta(seconds=CUE_CLAIM_SECONDS)).isoformat()
+        }},
+        array_filters=[{
+            "target.id": line["id"],
+            "target.text": line["text"],
+            "target.audio_url": None,
+            "target.audio_pending_until": {"$not": {"$gt": now.isoformat()}}
+        }]
+    )
+    return result.modified_count > 0
+
+class CueLookaheadSession:
+    """Generates cue audio for the next few cue lines ahead of a rehearsal.
+
+    One session exists per (user, project) in each worker process. Lines are
+    generated nearest-first with bounded concurrency, and work for lines the
+    actor has already moved past is cancelled.
+    """
+
+    def __init__(self, project_id: str, user_id: str):
+        self.project_id = project_id
+        self.user_id = user_id
+        self.project: dict = {}
+        self.lines: List[dict] = []
+        self.position = 0
+        self.lookahead = CUE_LOOKAHEAD_LINES
+        self.in_flight: Dict[str, tuple[int, asyncio.Task]] = {}
+        self.finished: set = set()
+        self.last_seen = time.monotonic()
+        self.wakeup = asyncio.Event()
+        self.runner: Optional[asyncio.Task] = None
+
+    def advance(self, project: dict, position: int, lookahead: int):
+        """Move the rehearsal position and reschedule generation."""
+        self.project = {k: v for k, v in project.items() if k != "scenes"}
+        self.lines = project_lines(project)
+        self.position = position
+        self.lookahead = lookahead
+        self.last_seen = time.monotonic()
+        
+        # Cancel work for lines the actor has skipped past
+        for line_id, (index, task) in list(self.in_flight.items()):
+            if index < position:
+                task.cancel()
+        
+        if self.runner is None or self.runner.done():
+            self.runner = asyncio.create_task(self.run())
+        self.wakeup.set()
+
+    def upcoming(self) -> List[tuple[int, dict]]:
+        """Next cue lines from the current position, nearest first."""
+        upcoming = []
+        for index in range(self.position, len(self.lines)):
+            if len(upcoming) >= self.lookahead:
+                break
+            line = self.lines[index]
+            if not line.get("is_user_line"):
+                upcoming.append((index, line))
+        return upcoming
+
+    def cancel(self):
+        for _, task in self.in_flight.values():
+            task.cancel()
+        if self.runner:
+            self.runner.cancel()
+
+    async def run(self):
+        while time.monotonic() - self.last_seen < CUE_LOOKAHEAD_IDLE_SECONDS:
+            for index, line in self.upcoming():
+                if len(self.in_flight) >= CUE_LOOKAHEAD_CONCURRENCY:
+                    break
+                if line.get("audio_url") or line["id"] in self.in_flight or line["id"] in self.finished:
+                    continue
+                task = asyncio.create_task(self.generate(line))
+                self.in_flight[line["id"]] = (index, task)
+                task.add_done_callback(lambda _, line_id=line["id"]: self.on_done(line_id))
+            
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                pass
         
-        audio_data = b""
-        for chunk in audio_generator:
-            audio_data += chunk
+        for _, task in self.in_flight.values():
+            task.cancel()
+        lookahead_sessions.pop((self.user_id, self.project_id), None)
+
+    def on_done(self, line_id: str):
+        self.in_flight.pop(line_id, None)
+        self.wakeup.set()
+
+    async def generate(self, line: dict):
+        try:
+            if not await claim_line_generation(self.project_id, line):
+                # Already voiced, or being voiced by another worker
+                self.finished.add(line["id"])
+                return
+            # The actor is about to reach this cue, so it competes with single-line requests
+            audio_fields, new_bytes = await synthesize_line_audio(self.project, line, priority="interactive")
+            await save_line_audio(
+                self.project_id, self.user_id, line, {**audio_fields, "audio_pending_until": None}, new_bytes, self.lines
+            )
+            line["audio_url"] = audio_fields["audio_url"]
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Look-ahead generation failed for line {line['id']}: {e}")
+        # Failed lines are not retried within this session
+        self.finished.add(line["id"])
+
+lookahead_sessions: Dict[tuple[str, str], CueLookaheadSession] = {}
+
+@api_router.post("/projects/{project_id}/rehearsal/position")
+async def update_rehearsal_position(
+    project_id: str,
+    request: RehearsalPositionRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Start or advance a rehearsal and pre-generate audio for the upcoming cues.
+
+    Returns the audio already available for the look-ahead window so the
+    reader can pick up lines that were generated in the background.
+    """
+    project = await db.projects.find_one(
+        {"id": project_id, "user_id": current_user["id"]},
+        {"_id": 0, "scenes": 1, "character_analysis": 1}
+    )
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    lines = [line for scene in project.get("scenes", []) for line in scene.get("lines", [])]
+    position = request.line_index
+    if request.line_id:
+        position = next((i for i, line in enumerate(lines) if line["id"] == request.line_id), position)
+    position = max(0, min(position, len(lines)))
+    
+    key = (current_user["id"], project_id)
+    session = lookahead_sessions.get(key)
+    if tts_provider.configured:
+        if session is None:
+            session = CueLookaheadSession(project_id, current_user["id"])
+            lookahead_sessions[key] = session
+        session.advance(project, position, request.lookahead)
+    
+    window = lines[position:]
+    ready = {}
+    pending = []
+    cue_count = 0
+    for line in window:
+        if cue_count >= request.lookahead:
+            break
+        if line.get("is_user_line"):
+            continue
+        cue_count += 1
+        if line.get("audio_url"):
+            ready[line["id"]] = pick_audio_url(line, select_audio_format(request.audio_format, None))
+        else:
+            pending.append(line["id"])
+    
+    return {"position": position, "ready": ready, "pending": pending}
+
+@api_router.delete("/projects/{project_id}/rehearsal")
+async def stop_rehearsal(project_id: str, current_user: dict = Depends(get_current_user)):
+    """Stop look-ahead generation for a rehearsal."""
+    session = lookahead_sessions.pop((current_user["id"], project_id), None)
+    if session:
+        session.cancel()
+    return {"message": "Rehearsal stopped"}
+
+
+# ============== VOICE PREVIEW & MANUAL SELECTION ==============
+
+class VoicePreviewRequest(BaseModel):
+    voice_id: str
+    text: str
+
+class VoiceConfigItem(BaseModel):
+    voice_id: str
+    gender: str
+    age_group: str
+
+class ManualVoiceRequest(BaseModel):
+    voice_config: Dict[str, VoiceConfigItem]
+
+@api_router.post("/voice-preview")
+async def preview_voice(
+    request: VoicePreviewRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Generate a voice preview for the given voice ID and text."""
+    if not tts_provider.configured:
+        raise HTTPException(status_code=503, detail="ElevenLabs not configured")
+    
+    try:
+        audio_data = await synthesize_speech(
+            request.text[:200],  # Limit preview length
+            request.voice_id,
+            VoiceSettings(stability=0.5, similarity_boost=0.75, style=0.5, use_speaker_boost=True),
+            priority="interactive"
+        )
         
         audio_b64 = base64.b64encode(audio_data).decode()
-        return {"audio_url": f"data:audio/mpeg;base64,{audio_b64}"}
+        return {"audio_url": f"data:{AUDIO_MEDIA_TYPES[tts_provider.audio_format]};base64,{audio_b64}"}
         
     except Exception as e:
         logging.error(f"Voice preview error: {e}")
@@ -1815,12 +3031,18 @@ async def generate_voices_manual(
     request: ManualVoiceRequest,
     current_user: dict = Depends(get_current_user)
 ):
-    """Generate voices using manual voice selections."""
-    project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]})
+    """Generate voices using manual voice selections.
+
+    Lines whose audio was already generated from the same text, voice and
+    settings are skipped, and every line is saved as soon as it is voiced, so
+    a retried request resumes where a failed one stopped.
+    """
+    project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]}, {"_id": 0})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     generated_count = 0
+    skipped_count = 0
     errors = []
     
     # Update character analysis with manual selections
@@ -1845,6 +3067,14 @@ async def generate_voices_manual(
                 "description": f"Manual voice selection for {char_name}"
             })
     
+    await db.projects.update_one(
+        {"id": project_id},
+        {"$set": {
+            "character_analysis": character_analysis,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }}
+    )
+    
     # Generate audio for each line
     for scene in project.get("scenes", []):
         for line in scene.get("lines", []):
@@ -1870,61 +3100,319 @@ async def generate_voices_manual(
                 # Use default voice
                 voice_id = "21m00Tcm4TlvDq8ikWAM"  # Rachel
             
-            # Get emotion settings
-            emotion = LineEmotion(**line["emotion"]) if line.get("emotion") else None
-            voice_settings = get_voice_settings_for_emotion(emotion)
+            # Skip lines already voiced with this exact voice, settings and text
+            fingerprint = audio_fingerprint(line["text"], voice_id, get_line_voice_settings(line))
+            if line.get("audio_url") and line.get("audio_fingerprint") == fingerprint:
+                skipped_count += 1
+                continue
             
             try:
-                audio_generator = eleven_client.text_to_speech.convert(
-                    text=line["text"],
-                    voice_id=voice_id,
-                    model_id="eleven_multilingual_v2",
-                    voice_settings=voice_settings
-                )
-                
-                audio_data = b""
-                for chunk in audio_generator:
-                    audio_data += chunk
-                
-                audio_b64 = base64.b64encode(audio_data).decode()
-                line["audio_url"] = f"data:audio/mpeg;base64,{audio_b64}"
-                generated_count += 1
+                audio_fields, new_bytes = await synthesize_line_audio(project, line, voice_id=voice_id)
+                if await save_line_audio(project_id, current_user["id"], line, audio_fields, new_bytes, project_lines(project)):
+                    generated_count += 1
                 
             except Exception as e:
                 logging.error(f"Voice generation error for {char_name}: {e}")
                 errors.append(f"{char_name}: {str(e)}")
     
-    # Save updated project
-    await db.projects.update_one(
-        {"id": project_id},
-        {"$set": {
-            "scenes": project["scenes"],
-            "character_analysis": character_analysis,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-    
-    logging.info(f"Manual voice generation: {generated_count} lines, {len(errors)} errors")
+    logging.info(f"Manual voice generation: {generated_count} lines, {skipped_count} unchanged, {len(errors)} errors")
     
     updated = await db.projects.find_one({"id": project_id}, {"_id": 0})
     return ProjectResponse(**updated)
 
 
+# ============== RATE LIMITING ==============
+
+# Public (unauthenticated) endpoints are limited so scrapers and link
+# unfurlers can't use up the workers that rehearsal traffic needs
+# Reverse proxies in front of the app, counted from the app outwards. The
+# deployment sits behind one ingress proxy, so every request reaches us from
+# the ingress address; keying on that would put all visitors in one bucket.
+# Set to 0 only when clients connect directly (X-Forwarded-For is then ignored),
+# or to 2+ when a CDN or load balancer sits in front of the ingress.
+TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", "1"))
+SHARE_RATE_PER_IP_PER_MINUTE = float(os.environ.get("SHARE_RATE_PER_IP_PER_MINUTE", "30"))
+SHARE_RATE_PER_TOKEN_PER_MINUTE = float(os.environ.get("SHARE_RATE_PER_TOKEN_PER_MINUTE", "120"))
+MEDIA_RATE_PER_IP_PER_MINUTE = float(os.environ.get("MEDIA_RATE_PER_IP_PER_MINUTE", "600"))
+PUBLIC_MAX_IN_FLIGHT = int(os.environ.get("PUBLIC_MAX_IN_FLIGHT", "32"))
+RATE_LIMIT_MAX_KEYS = 10000
+
+class TokenBucketLimiter:
+    """Token buckets per key, holding at most max_keys (least recently used go first)."""
+
+    def __init__(self, per_minute: float, burst: int, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        """Take a token for key; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self.buckets[key] = (tokens, now)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+share_ip_limiter = TokenBucketLimiter(SHARE_RATE_PER_IP_PER_MINUTE, burst=10)
+share_token_limiter = TokenBucketLimiter(SHARE_RATE_PER_TOKEN_PER_MINUTE, burst=30)
+media_ip_limiter = TokenBucketLimiter(MEDIA_RATE_PER_IP_PER_MINUTE, burst=120)
+public_in_flight = 0
+
+def client_ip(request: Request) -> str:
+    """Address of the client, as seen by the outermost trusted proxy.
+
+    Each proxy appends the peer it received the request from, so only the
+    last TRUSTED_PROXY_COUNT hops are trustworthy; anything to their left is
+    whatever the client chose to send.
+    """
+    if TRUSTED_PROXY_COUNT > 0:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_COUNT:
+            return hops[-TRUSTED_PROXY_COUNT]
+    return request.client.host if request.client else "unknown"
+
+def enforce_rate_limit(limiter: TokenBucketLimiter, key: str):
+    wait = limiter.acquire(key)
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+async def limit_media_requests(request: Request):
+    enforce_rate_limit(media_ip_limiter, client_ip(request))
+
+async def limit_share_requests(request: Request, share_token: str):
+    """Per-IP and per-token buckets plus a cap on concurrent public requests."""
+    global public_in_flight
+    enforce_rate_limit(share_ip_limiter, client_ip(request))
+    enforce_rate_limit(share_token_limiter, share_token)
+    if public_in_flight >= PUBLIC_MAX_IN_FLIGHT:
+        raise HTTPException(status_code=503, detail="Server busy", headers={"Retry-After": "1"})
+    public_in_flight += 1
+    try:
+        yield
+    finally:
+        public_in_flight -= 1
+
 # ============== TAKES MANAGEMENT ==============
 
+TAKE_MEDIA_URL_HOURS = 6
+# Shapes of the expiry and signature in signed links, checked before any
+# parsing so that arbitrary input can't raise
+SIGNED_EXPIRY = re.compile(r"[0-9]{1,12}")
+SIGNATURE = re.compile(r"[0-9a-f]{32}")
+
+def sign_take_media(take_id: str, expires: int) -> str:
+    message = f"take-media:{take_id}:{expires}".encode()
+    return hmac.new(JWT_SECRET.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+def take_media_url(take_id: str, filename: str, expires_at: Optional[datetime] = None) -> str:
+    """Signed, expiring URL for a file in a take's blob directory.
+
+    Video elements can't send the bearer token, so access is granted by the
+    signature in the path instead. The signature covers the whole take
+    directory, so relative references between its files (such as playlist
+    segments) keep working. Expiry is rounded up to the hour to keep URLs
+    stable and cacheable.
+    """
+    if expires_at is None:
+        expires_at = datetime.now(timezone.utc) + timedelta(hours=TAKE_MEDIA_URL_HOURS)
+    expires = -(-int(expires_at.timestamp()) // 3600) * 3600
+    return f"/api/takes/{take_id}/media/{expires}.{sign_take_media(take_id, expires)}/{filename}"
+
+def take_video_url(take: dict, expires_at: Optional[datetime] = None) -> str:
+    if take.get("video_blob"):
+        return take_media_url(take["id"], take["video_blob"].rsplit("/", 1)[-1], expires_at)
+    return take.get("video_url", "")
+
+async def next_take_number(project_id: str, user_id: str) -> int:
+    """Hand out the next take number from a per-project counter.
+
+    Numbers are never reused, even after a take is deleted.
+    """
+    key = f"takes:{project_id}:{user_id}"
+    counter = await db.counters.find_one_and_update({"_id": key}, {"$inc": {"seq": 1}}, return_document=True)
+    if counter:
+        return counter["seq"]
+    
+    # First take since counters were introduced: continue after existing takes
+    last = await db.takes.find_one(
+        {"project_id": project_id, "user_id": user_id},
+        {"_id": 0, "take_number": 1},
+        sort=[("take_number", -1)]
+    )
+    try:
+        await db.counters.update_one({"_id": key}, {"$max": {"seq": last["take_number"] if last else 0}}, upsert=True)
+    except DuplicateKeyError:
+        pass  # A concurrent save seeded it first
+    counter = await db.counters.find_one_and_update({"_id": key}, {"$inc": {"seq": 1}}, return_document=True)
+    return counter["seq"]
+
+TAKE_PAGE_SIZE = 50
+TAKE_LIST_SORT = [("is_favorite", -1), ("created_at", -1), ("id", -1)]
+# Legacy takes may still carry their video inline until migrated
+TAKE_LIST_PROJECTION = {"_id": 0, "video_url": 0}
+
+def encode_take_cursor(take: dict) -> str:
+    position = [bool(take.get("is_favorite")), take["created_at"], take["id"]]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+def take_cursor_filter(cursor: str) -> dict:
+    """Mongo filter for takes sorting after the cursor position."""
+    try:
+        is_favorite, created_at, take_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(is_favorite, bool) or not isinstance(created_at, str) or not isinstance(take_id, str):
+        raise ValueError("Invalid cursor")
+    
+    after = [
+        {"is_favorite": is_favorite, "created_at": created_at, "id": {"$lt": take_id}},
+        {"is_favorite": is_favorite, "created_at": {"$lt": created_at}},
+    ]
+    if is_favorite:
+        after.append({"is_favorite": False})
+    return {"$or": after}
+
+async def store_take_video(take_id: str, data_url: str) -> dict:
+    """Decode a base64 data URL into the take's blob directory.
+
+    Returns the take fields describing the stored video.
+    """
+    header, _, encoded = data_url.partition(",")
+    content_type = header.removeprefix("data:").split(";")[0].strip().lower() or "video/webm"
+    if content_type not in VIDEO_EXTENSIONS:
+        raise ValueError("Unsupported video format")
+    try:
+        video_bytes = base64.b64decode(encoded)
+    except ValueError:
+        raise ValueError("Invalid video data")
+    
+    video_key = f"takes/{take_id}/original.{VIDEO_EXTENSIONS[content_type]}"
+    await put_blob(video_key, video_bytes)
+    return {"video_blob": video_key, "content_type": content_type, "size_bytes": len(video_bytes)}
+
+async def migrate_inline_takes():
+    """Move takes stored as base64 data URLs out of their documents.
+
+    Runs once per startup; takes are moved one at a time so memory use is
+    bounded by the largest legacy take (at most the 16 MB document limit).
+    """
+    async for ref in db.takes.find({"video_url": {"$regex": "^data:"}}, {"_id": 0, "id": 1}):
+        take = await db.takes.find_one({"id": ref["id"], "video_blob": {"$exists": False}}, {"_id": 0, "video_url": 1})
+        if not take or not take.get("video_url", "").startswith("data:"):
+            continue
+        try:
+            video_fields = await store_take_video(ref["id"], take["video_url"])
+        except Exception as e:
+            logging.error(f"Could not migrate take {ref['id']} to blob storage: {e}")
+            continue
+        await db.takes.update_one(
+            {"id": ref["id"], "video_blob": {"$exists": False}},
+            {"$set": video_fields, "$unset": {"video_url": ""}}
+        )
+        logging.info(f"Moved take {ref['id']} video to blob storage ({video_fields['size_bytes']} bytes)")
+
+def take_mp4_url(take: dict, expires_at: Optional[datetime] = None) -> Optional[str]:
+    if not take.get("mp4_blob"):
+        return None
+    return take_media_url(take["id"], take["mp4_blob"].rsplit("/", 1)[-1], expires_at)
+
+def take_preview_fields(take: dict, expires_at: Optional[datetime] = None) -> dict:
+    """Signed poster and storyboard URLs plus waveform peaks, once computed."""
+    previews = take.get("previews") or {}
+    storyboard = previews.get("storyboard")
+    return {
+        "thumbnail_url": take_media_url(take["id"], previews["poster"], expires_at) if previews.get("poster") else take.get("thumbnail_url"),
+        "storyboard": {**storyboard, "url": take_media_url(take["id"], storyboard["file"], expires_at)} if storyboard else None,
+        "waveform": previews.get("waveform"),
+    }
+
+def take_response(take: dict) -> TakeResponse:
+    return TakeResponse(**{
+        **take,
+        "video_url": take_video_url(take),
+        "mp4_url": take_mp4_url(take),
+        **take_preview_fields(take),
+    })
+
+@api_router.api_route(
+    "/takes/{take_id}/media/{token}/{filename:path}",
+    methods=["GET", "HEAD"],
+    dependencies=[Depends(limit_media_requests)]
+)
+async def get_take_media(take_id: str, token: str, filename: str, request: Request):
+    """Stream a take's video (or derived files) with Range and ETag support."""
+    expires_text, _, signature = token.partition(".")
+    if (
+        not SIGNED_EXPIRY.fullmatch(expires_text)
+        or not SIGNATURE.fullmatch(signature)
+        or not hmac.compare_digest(signature, sign_take_media(take_id, int(expires_text)))
+    ):
+        raise HTTPException(status_code=403, detail="Invalid media link")
+    if int(expires_text) < time.time():
+        raise HTTPException(status_code=410, detail="Media link has expired")
+    
+    try:
+        if filename.startswith(".") or "/." in filename:
+            raise ValueError("Hidden files are not served")
+        path = blob_path(f"takes/{take_id}/{filename}")
+    except ValueError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    stat = path.stat()
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return blob_response(
+        request,
+        path,
+        media_type=media_type,
+        etag=f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+        cache_control=f"private, max-age={max(0, int(expires_text) - int(time.time()))}"
+    )
+
+
 @api_router.get("/projects/{project_id}/takes", response_model=List[TakeResponse])
-async def get_takes(project_id: str, current_user: dict = Depends(get_current_user)):
-    """Get all takes for a project."""
-    project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]})
+async def get_takes(
+    project_id: str,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(TAKE_PAGE_SIZE, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get takes for a project, favorites first then newest.
+
+    Pages are keyset-paginated; the next page's cursor is returned in the
+    X-Next-Cursor header.
+    """
+    project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]}, {"_id": 1})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    takes = await db.takes.find(
-        {"project_id": project_id, "user_id": current_user["id"]},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+    query = {"project_id": project_id, "user_id": current_user["id"]}
+    if cursor:
+        try:
+            query.update(take_cursor_filter(cursor))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    takes = await db.takes.find(query, TAKE_LIST_PROJECTION).sort(TAKE_LIST_SORT).limit(limit + 1).to_list(limit + 1)
     
-    return [TakeResponse(**t) for t in takes]
+    if len(takes) > limit:
+        takes = takes[:limit]
+        response.headers["X-Next-Cursor"] = encode_take_cursor(takes[-1])
+    return [take_response(t) for t in takes]
 
 @api_router.post("/projects/{project_id}/takes", response_model=TakeResponse)
 async def create_take(
@@ -1936,31 +3424,39 @@ async def create_take(
     project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    
-    # Get take count for numbering
-    take_count = await db.takes.count_documents({"project_id": project_id, "user_id": current_user["id"]})
+    await check_take_limit(current_user, project_id)
     
     take_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
-    # Store video as data URL
+    # Store the video in the blob store rather than inside the document
     video_url = take_data.video_data if take_data.video_data.startswith('data:') else f"data:video/webm;base64,{take_data.video_data}"
+    try:
+        video_fields = await store_take_video(take_id, video_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not await reserve_storage(current_user, video_fields["size_bytes"]):
+        await asyncio.to_thread(shutil.rmtree, blob_path(f"takes/{take_id}"), True)
+        raise HTTPException(status_code=413, detail="Storage quota exceeded")
     
     take_doc = {
         "id": take_id,
         "project_id": project_id,
         "user_id": current_user["id"],
-        "take_number": take_count + 1,
+        "take_number": await next_take_number(project_id, current_user["id"]),
         "duration": take_data.duration,
         "notes": take_data.notes or "",
         "is_favorite": False,
-        "video_url": video_url,
+        **video_fields,
+        "storage_bytes": video_fields["size_bytes"],
         "thumbnail_url": None,
         "created_at": now
     }
     
     await db.takes.insert_one(take_doc)
-    return TakeResponse(**take_doc)
+    await enqueue_job("take_mp4", take_id, {"take_id": take_id})
+    await enqueue_job("take_previews", take_id, {"take_id": take_id})
+    return take_response(take_doc)
 
 @api_router.get("/projects/{project_id}/takes/{take_id}", response_model=TakeResponse)
 async def get_take(
@@ -1976,7 +3472,7 @@ async def get_take(
     if not take:
         raise HTTPException(status_code=404, detail="Take not found")
     
-    return TakeResponse(**take)
+    return take_response(take)
 
 @api_router.put("/projects/{project_id}/takes/{take_id}", response_model=TakeResponse)
 async def update_take(
@@ -1998,9 +3494,10 @@ async def update_take(
     
     if update_data:
         await db.takes.update_one({"id": take_id}, {"$set": update_data})
+        share_cache.invalidate(take_id=take_id)
     
     updated = await db.takes.find_one({"id": take_id}, {"_id": 0})
-    return TakeResponse(**updated)
+    return take_response(updated)
 
 @api_router.delete("/projects/{project_id}/takes/{take_id}")
 async def delete_take(
@@ -2009,11 +3506,15 @@ async def delete_take(
     current_user: dict = Depends(get_current_user)
 ):
     """Delete a take."""
-    result = await db.takes.delete_one(
-        {"id": take_id, "project_id": project_id, "user_id": current_user["id"]}
+    take = await db.takes.find_one_and_delete(
+        {"id": take_id, "project_id": project_id, "user_id": current_user["id"]},
+        projection={"_id": 0, "storage_bytes": 1, "cloud_public_id": 1}
     )
-    if result.deleted_count == 0:
+    if not take:
         raise HTTPException(status_code=404, detail="Take not found")
+    await charge_storage(current_user["id"], -take.get("storage_bytes", 0))
+    share_cache.invalidate(take_id=take_id)
+    await enqueue_job("take_cleanup", take_id, {"take_id": take_id, "cloud_public_id": take.get("cloud_public_id")})
     
     return {"message": "Take deleted"}
 
@@ -2023,38 +3524,565 @@ async def convert_take_to_mp4(
     take_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Convert a WebM take to MP4 format."""
+    """Queue conversion of a take to MP4 and report its progress."""
     take = await db.takes.find_one(
         {"id": take_id, "project_id": project_id, "user_id": current_user["id"]},
-        {"_id": 0}
+        {"_id": 0, "video_url": 0}
     )
     if not take:
         raise HTTPException(status_code=404, detail="Take not found")
     
-    # Extract base64 video data
-    video_url = take["video_url"]
-    if not video_url.startswith("data:"):
+    if not take.get("video_blob"):
         raise HTTPException(status_code=400, detail="Invalid video format")
     
+    if not take.get("mp4_blob"):
+        await enqueue_job("take_mp4", take_id, {"take_id": take_id}, restart=True)
+    return await take_mp4_status(take)
+
+@api_router.get("/projects/{project_id}/takes/{take_id}/convert")
+async def get_take_conversion(
+    project_id: str,
+    take_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the status of a take's MP4 conversion."""
+    take = await db.takes.find_one(
+        {"id": take_id, "project_id": project_id, "user_id": current_user["id"]},
+        {"_id": 0, "video_url": 0}
+    )
+    if not take:
+        raise HTTPException(status_code=404, detail="Take not found")
+    return await take_mp4_status(take)
+
+async def take_mp4_status(take: dict) -> dict:
+    if take.get("mp4_blob"):
+        return {"status": "done", "format": "mp4", "video_url": take_mp4_url(take)}
+    job = await get_job("take_mp4", take["id"])
+    if not job:
+        return {"status": "not_started", "format": "mp4", "video_url": None}
+    return {"status": job["status"], "format": "mp4", "video_url": None, "error": job.get("error")}
+
+@job_handler("take_mp4")
+async def transcode_take_mp4(payload: dict) -> Optional[dict]:
+    """Produce an MP4 rendition of a take.
+
+    Streams already in MP4-friendly codecs (H.264 video, AAC audio) are
+    copied as-is; only the others are re-encoded.
+    """
+    take = await db.takes.find_one({"id": payload["take_id"]}, {"_id": 0, "user_id": 1, "video_blob": 1, "mp4_blob": 1})
+    if not take or not take.get("video_blob"):
+        return None
+    if take.get("mp4_blob"):
+        return {"mp4_blob": take["mp4_blob"]}
+    
+    source = blob_path(take["video_blob"])
+    codecs = await probe_media_codecs(source)
+    if "video" not in codecs:
+        raise RuntimeError("Take has no video stream")
+    video_args = ["-c:v", "copy"] if codecs["video"] == "h264" else [
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p"
+    ]
+    audio_args = [] if "audio" not in codecs else (
+        ["-c:a", "copy"] if codecs["audio"] == "aac" else ["-c:a", "aac", "-b:a", "128k"]
+    )
+    
+    mp4_key = f"takes/{payload['take_id']}/take.mp4"
+    target = blob_path(mp4_key)
+    tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
     try:
-        # Parse data URL
-        header, encoded = video_url.split(",", 1)
-        video_bytes = base64.b64decode(encoded)
+        await run_ffmpeg([
+            "-y", "-i", str(source),
+            "-map", "0:v:0", "-map", "0:a:0?",
+            *video_args, *audio_args,
+            "-movflags", "+faststart", "-f", "mp4", str(tmp_path)
+        ])
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, target)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    
+    result = await db.takes.update_one(
+        {"id": payload["take_id"], "mp4_blob": {"$exists": False}},
+        {"$set": {"mp4_blob": mp4_key, "mp4_size_bytes": size}}
+    )
+    if result.modified_count:
+        await charge_storage(take["user_id"], size, payload["take_id"])
+    remuxed = codecs["video"] == "h264" and codecs.get("audio") in (None, "aac")
+    logging.info(f"Take {payload['take_id']} MP4 ready ({'remuxed' if remuxed else 'transcoded'}, {size} bytes)")
+    return {"mp4_blob": mp4_key, "remuxed": remuxed}
+
+POSTER_WIDTH = 480
+STORYBOARD_TILES = 10
+STORYBOARD_TILE_WIDTH = 160
+WAVEFORM_PEAKS = 100
+WAVEFORM_SAMPLE_RATE = 8000
+
+def waveform_peaks(pcm: bytes, buckets: int = WAVEFORM_PEAKS) -> List[float]:
+    """Reduce 16-bit mono PCM to per-bucket peak amplitudes in 0..1."""
+    samples = np.abs(np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype="<i2").astype(np.int32))
+    if samples.size == 0:
+        return []
+    buckets = min(buckets, samples.size)
+    # array_split tolerates lengths that don't divide evenly
+    peaks = np.array([chunk.max() for chunk in np.array_split(samples, buckets)], dtype=np.float64) / 32768.0
+    return [round(float(p), 3) for p in peaks]
+
+@job_handler("take_previews")
+async def compute_take_previews(payload: dict) -> Optional[dict]:
+    """Extract a poster frame, a scrub storyboard and waveform peaks for a take."""
+    take = await db.takes.find_one({"id": payload["take_id"]}, {"_id": 0, "user_id": 1, "video_blob": 1, "duration": 1})
+    if not take or not take.get("video_blob"):
+        return None
+    
+    source = str(blob_path(take["video_blob"]))
+    take_dir = f"takes/{payload['take_id']}"
+    # Picks a representative frame from the opening instead of a black first frame
+    poster = await run_ffmpeg([
+        "-i", source, "-map", "0:v:0", "-vf", f"thumbnail=50,scale={POSTER_WIDTH}:-2",
+        "-frames:v", "1", "-q:v", "4", "-f", "mjpeg", "pipe:1"
+    ])
+    await put_blob(f"{take_dir}/poster.jpg", poster)
+    
+    duration = max(int(take.get("duration") or 0), 1)
+    storyboard = await run_ffmpeg([
+        "-i", source, "-map", "0:v:0",
+        "-vf", f"fps={STORYBOARD_TILES}/{duration},scale={STORYBOARD_TILE_WIDTH}:-2,tile={STORYBOARD_TILES}x1",
+        "-frames:v", "1", "-q:v", "5", "-f", "mjpeg", "pipe:1"
+    ])
+    await put_blob(f"{take_dir}/storyboard.jpg", storyboard)
+    
+    try:
+        pcm = await run_ffmpeg([
+            "-i", source, "-vn", "-ac", "1", "-ar", str(WAVEFORM_SAMPLE_RATE), "-f", "s16le", "pipe:1"
+        ])
+    except RuntimeError:
+        # Video-only takes have no audio stream to decode
+        pcm = b""
+    
+    previews = {
+        "poster": "poster.jpg",
+        "storyboard": {
+            "file": "storyboard.jpg",
+            "tiles": STORYBOARD_TILES,
+            "columns": STORYBOARD_TILES,
+            "tile_width": STORYBOARD_TILE_WIDTH,
+            "interval": duration / STORYBOARD_TILES,
+        },
+        "waveform": await asyncio.to_thread(waveform_peaks, pcm),
+    }
+    result = await db.takes.update_one(
+        {"id": payload["take_id"], "previews": {"$exists": False}},
+        {"$set": {"previews": previews}}
+    )
+    if result.modified_count:
+        await charge_storage(take["user_id"], len(poster) + len(storyboard), payload["take_id"])
+        share_cache.invalidate(take_id=payload["take_id"])
+    return {"poster": previews["poster"], "peaks": len(previews["waveform"])}
+
+# Ladder for share-link playback; rungs taller than the source are skipped
+HLS_VARIANTS = [
+    {"height": 360, "video_bitrate": "800k", "audio_bitrate": "96k"},
+    {"height": 540, "video_bitrate": "1800k", "audio_bitrate": "128k"},
+    {"height": 720, "video_bitrate": "3000k", "audio_bitrate": "128k"},
+]
+# Short segments let players start after downloading a couple of seconds
+HLS_SEGMENT_SECONDS = 2
+
+def take_playlist_url(take: dict, expires_at: Optional[datetime] = None) -> Optional[str]:
+    if not take.get("hls_playlist"):
+        return None
+    return take_media_url(take["id"], take["hls_playlist"], expires_at)
+
+@job_handler("take_hls")
+async def package_take_hls(payload: dict) -> Optional[dict]:
+    """Package a take as adaptive HLS (master playlist plus one stream per bitrate)."""
+    take = await db.takes.find_one({"id": payload["take_id"]}, {"_id": 0, "user_id": 1, "video_blob": 1, "hls_playlist": 1})
+    if not take or not take.get("video_blob"):
+        return None
+    if take.get("hls_playlist"):
+        return {"hls_playlist": take["hls_playlist"]}
+    
+    source = blob_path(take["video_blob"])
+    codecs = await probe_media_codecs(source)
+    if "video" not in codecs:
+        raise RuntimeError("Take has no video stream")
+    source_height = codecs.get("height") or HLS_VARIANTS[-1]["height"]
+    variants = [v for v in HLS_VARIANTS if v["height"] <= source_height] or HLS_VARIANTS[:1]
+    has_audio = "audio" in codecs
+    
+    filters = [f"[0:v]split={len(variants)}" + "".join(f"[s{i}]" for i in range(len(variants)))]
+    args = ["-y", "-i", str(source)]
+    stream_map = []
+    for i, variant in enumerate(variants):
+        filters.append(f"[s{i}]scale=-2:{variant['height']}[v{i}]")
+        args += ["-map", f"[v{i}]"]
+        if has_audio:
+            args += ["-map", "0:a:0"]
+        stream_map.append(f"v:{i},a:{i}" if has_audio else f"v:{i}")
+    args[3:3] = ["-filter_complex", ";".join(filters)]
+    for i, variant in enumerate(variants):
+        args += [
+            f"-b:v:{i}", variant["video_bitrate"],
+            f"-maxrate:v:{i}", variant["video_bitrate"],
+            f"-bufsize:v:{i}", variant["video_bitrate"],
+        ]
+        if has_audio:
+            args += [f"-b:a:{i}", variant["audio_bitrate"]]
+    
+    take_dir = blob_path(f"takes/{payload['take_id']}")
+    work_dir = take_dir / f".hls-{uuid.uuid4().hex}"
+    work_dir.mkdir(parents=True)
+    try:
+        await run_ffmpeg([
+            *args,
+            "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+            "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+            "-c:a", "aac", "-ac", "2",
+            "-f", "hls",
+            "-hls_time", str(HLS_SEGMENT_SECONDS),
+            "-hls_playlist_type", "vod",
+            "-hls_segment_filename", str(work_dir / "v%v" / "seg%03d.ts"),
+            "-master_pl_name", "master.m3u8",
+            "-var_stream_map", " ".join(stream_map),
+            str(work_dir / "v%v" / "index.m3u8")
+        ])
+        size = sum(f.stat().st_size for f in work_dir.rglob("*") if f.is_file())
+        await asyncio.to_thread(shutil.rmtree, take_dir / "hls", True)
+        os.replace(work_dir, take_dir / "hls")
+    finally:
+        await asyncio.to_thread(shutil.rmtree, work_dir, True)
+    
+    result = await db.takes.update_one(
+        {"id": payload["take_id"], "hls_playlist": {"$exists": False}},
+        {"$set": {"hls_playlist": "hls/master.m3u8", "hls_variants": [v["height"] for v in variants]}}
+    )
+    if result.modified_count:
+        await charge_storage(take["user_id"], size, payload["take_id"])
+        share_cache.invalidate(take_id=payload["take_id"])
+    return {"hls_playlist": "hls/master.m3u8", "variants": len(variants)}
+
+# ============== TAKE UPLOADS ==============
+# Resumable binary uploads: init a session, PUT raw chunks at the current
+# offset (GET the session to find it after a dropped connection), then
+# complete it to create the take. Chunks stream straight into the blob store,
+# so server memory stays flat regardless of take size. The recorder opens a
+# session without a total size when recording starts and appends
+# MediaRecorder chunks as they are produced, so stopping only has to
+# complete the session.
+
+MAX_TAKE_UPLOAD_BYTES = int(os.environ.get("MAX_TAKE_UPLOAD_BYTES", str(2 * 1024 * 1024 * 1024)))
+MAX_UPLOAD_CHUNK_BYTES = 32 * 1024 * 1024
+UPLOAD_CHUNK_SIZE_HINT = 4 * 1024 * 1024
+UPLOAD_SESSION_HOURS = 24
+UPLOAD_LEASE_SECONDS = 600  # Outlives any single chunk, so a crashed writer doesn't block the upload for long
+
+VIDEO_EXTENSIONS = {
+    "video/webm": "webm",
+    "video/mp4": "mp4",
+    "video/quicktime": "mov",
+}
+
+class TakeUploadCreate(BaseModel):
+    content_type: str = "video/webm"
+    total_size: Optional[int] = Field(default=None, ge=0)
+
+class TakeUploadComplete(BaseModel):
+    duration: int  # seconds
+    notes: Optional[str] = ""
+    total_size: Optional[int] = None  # Final size for uploads started without one
+
+async def get_upload_session(upload_id: str, project_id: str, user_id: str) -> dict:
+    upload = await db.take_uploads.find_one(
+        {"id": upload_id, "project_id": project_id, "user_id": user_id},
+        {"_id": 0}
+    )
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+async def lease_upload(upload_id: str, match: dict) -> Optional[str]:
+    """Take an upload's lease so only one request touches its file at a time.
+
+    Returns the lease id, or None if the session no longer matches or another
+    request holds the lease.
+    """
+    now = datetime.now(timezone.utc)
+    lease_id = str(uuid.uuid4())
+    leased = await db.take_uploads.find_one_and_update(
+        {"id": upload_id, **match, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now.isoformat()}}]},
+        {"$set": {"lease_id": lease_id, "lease_until": (now + timedelta(seconds=UPLOAD_LEASE_SECONDS)).isoformat()}}
+    )
+    return lease_id if leased else None
+
+async def release_upload(upload_id: str, lease_id: str):
+    await db.take_uploads.update_one(
+        {"id": upload_id, "lease_id": lease_id},
+        {"$set": {"lease_id": None, "lease_until": None}}
+    )
+
+def upload_status(upload: dict) -> dict:
+    return {
+        "upload_id": upload["id"],
+        "offset": upload["offset"],
+        "total_size": upload.get("total_size"),
+        "status": upload["status"],
+        "chunk_size": UPLOAD_CHUNK_SIZE_HINT
+    }
+
+@api_router.post("/projects/{project_id}/takes/uploads")
+async def create_take_upload(
+    project_id: str,
+    upload_data: TakeUploadCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Start a resumable take upload."""
+    project = await db.projects.find_one({"id": project_id, "user_id": current_user["id"]}, {"_id": 0, "id": 1})
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    content_type = upload_data.content_type.split(";")[0].strip().lower()
+    if content_type not in VIDEO_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported video format")
+    if upload_data.total_size is not None and upload_data.total_size > MAX_TAKE_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Take is too large")
+    check_storage_quota(current_user, upload_data.total_size or 0)
+    await check_take_limit(current_user, project_id)
+    
+    upload_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    upload_doc = {
+        "id": upload_id,
+        "project_id": project_id,
+        "user_id": current_user["id"],
+        "content_type": content_type,
+        "total_size": upload_data.total_size,
+        "offset": 0,
+        "blob_key": f"uploads/{upload_id}",
+        "status": "open",
+        "created_at": now.isoformat(),
+        "expires_at": (now + timedelta(hours=UPLOAD_SESSION_HOURS)).isoformat()
+    }
+    await db.take_uploads.insert_one(upload_doc)
+    return upload_status(upload_doc)
+
+@api_router.get("/projects/{project_id}/takes/uploads/{upload_id}")
+async def get_take_upload(
+    project_id: str,
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the offset to resume an upload from."""
+    return upload_status(await get_upload_session(upload_id, project_id, current_user["id"]))
+
+async def write_upload_chunk(path: Path, offset: int, stream, max_bytes: int) -> int:
+    """Stream a request body into the upload file at `offset`, returning the bytes written.
+
+    Anything past `offset` (left over from an interrupted chunk) is discarded first.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    async with await anyio.open_file(path, "r+b" if path.exists() else "w+b") as f:
+        await f.truncate(offset)
+        await f.seek(offset)
+        async for chunk in stream:
+            written += len(chunk)
+            if written > max_bytes:
+                await f.truncate(offset)
+                raise ValueError("Chunk too large")
+            await f.write(chunk)
+    return written
+
+@api_router.put("/projects/{project_id}/takes/uploads/{upload_id}")
+async def upload_take_chunk(
+    project_id: str,
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: dict = Depends(get_current_user)
+):
+    """Append a raw chunk of video at `offset`.
+
+    Returns 409 with the server's offset if it doesn't match, so the client
+    can resume from the right place.
+    """
+    upload = await get_upload_session(upload_id, project_id, current_user["id"])
+    if upload["status"] != "open":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    
+    if offset != upload["offset"]:
+        raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "offset": upload["offset"]})
+    
+    # Concurrent PUTs at the same offset would interleave writes to the file
+    lease_id = await lease_upload(upload_id, {"status": "open", "offset": offset})
+    if not lease_id:
+        upload = await get_upload_session(upload_id, project_id, current_user["id"])
+        raise HTTPException(status_code=409, detail={"message": "Upload is busy", "offset": upload["offset"]})
+    
+    try:
+        path = blob_path(upload["blob_key"])
+        stored = path.stat().st_size if path.exists() else 0
+        if stored < offset:
+            raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "offset": stored})
         
-        # For now, just return the original - MP4 conversion would require FFmpeg
-        # In production, you'd use moviepy or ffmpeg here
-        # This is a placeholder that returns the original WebM
+        limit = MAX_TAKE_UPLOAD_BYTES - offset
+        if upload.get("total_size") is not None:
+            limit = min(limit, upload["total_size"] - offset)
+        try:
+            written = await write_upload_chunk(path, offset, request.stream(), min(limit, MAX_UPLOAD_CHUNK_BYTES))
+        except ValueError:
+            raise HTTPException(status_code=413, detail="Chunk exceeds the upload size limit")
         
-        return {
-            "message": "Video ready for download",
-            "format": "webm",
-            "video_url": video_url,
-            "note": "MP4 conversion available in production with FFmpeg"
+        # Advancing the offset hands back the lease in the same update
+        result = await db.take_uploads.update_one(
+            {"id": upload_id, "lease_id": lease_id},
+            {"$set": {
+                "offset": offset + written,
+                "lease_id": None,
+                "lease_until": None,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+        if result.modified_count == 0:
+            upload = await get_upload_session(upload_id, project_id, current_user["id"])
+            raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "offset": upload["offset"]})
+    finally:
+        await release_upload(upload_id, lease_id)
+    
+    upload["offset"] = offset + written
+    return upload_status(upload)
+
+@api_router.delete("/projects/{project_id}/takes/uploads/{upload_id}")
+async def abort_take_upload(
+    project_id: str,
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Discard an unfinished upload, e.g. when a recording is thrown away."""
+    upload = await get_upload_session(upload_id, project_id, current_user["id"])
+    if upload["status"] != "open":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    
+    if not await lease_upload(upload_id, {"status": "open"}):
+        raise HTTPException(status_code=409, detail="Upload is busy")
+    await db.take_uploads.delete_one({"id": upload_id, "status": "open"})
+    blob_path(upload["blob_key"]).unlink(missing_ok=True)
+    return {"message": "Upload discarded"}
+
+@api_router.post("/projects/{project_id}/takes/uploads/{upload_id}/complete", response_model=TakeResponse)
+async def complete_take_upload(
+    project_id: str,
+    upload_id: str,
+    complete_data: TakeUploadComplete,
+    current_user: dict = Depends(get_current_user)
+):
+    """Turn a fully uploaded video into a take."""
+    upload = await get_upload_session(upload_id, project_id, current_user["id"])
+    if upload["status"] == "complete":
+        # Retried completion - hand back the take that was already created
+        take = await db.takes.find_one({"id": upload["take_id"]}, {"_id": 0})
+        if take:
+            return take_response(take)
+        raise HTTPException(status_code=404, detail="Take not found")
+    if upload["status"] == "finalizing":
+        # A previous completion was interrupted - pick up where it stopped
+        return take_response(await resume_take_upload(upload))
+    expected_size = upload.get("total_size")
+    if expected_size is None:
+        expected_size = complete_data.total_size
+    if expected_size is not None and upload["offset"] != expected_size:
+        raise HTTPException(status_code=409, detail={"message": "Upload incomplete", "offset": upload["offset"]})
+    if upload["offset"] == 0:
+        raise HTTPException(status_code=400, detail="Upload is empty")
+    
+    if not await reserve_storage(current_user, upload["offset"]):
+        raise HTTPException(status_code=413, detail="Storage quota exceeded")
+    
+    upload_size = upload["offset"]
+    lease_id = await lease_upload(upload_id, {"status": "open", "offset": upload_size})
+    if not lease_id:
+        await charge_storage(current_user["id"], -upload_size)
+        raise HTTPException(status_code=409, detail="Upload is being completed")
+    # From here on the reservation belongs to the session: the take is only
+    # recorded once it exists, so a failure leaves a "finalizing" session
+    # that a retry (or the GC) finishes instead of one pointing at nothing
+    upload = await db.take_uploads.find_one_and_update(
+        {"id": upload_id, "lease_id": lease_id},
+        {"$set": {
+            "status": "finalizing",
+            "take_id": str(uuid.uuid4()),
+            "duration": complete_data.duration,
+            "notes": complete_data.notes or ""
+        }},
+        projection={"_id": 0},
+        return_document=True
+    )
+    if not upload:
+        await charge_storage(current_user["id"], -upload_size)
+        raise HTTPException(status_code=409, detail="Upload is being completed")
+    try:
+        take = await finalize_take_upload(upload)
+    finally:
+        await release_upload(upload_id, lease_id)
+    if not take:
+        raise HTTPException(status_code=410, detail="Uploaded video was lost")
+    return take_response(take)
+
+async def resume_take_upload(upload: dict) -> dict:
+    lease_id = await lease_upload(upload["id"], {"status": "finalizing"})
+    if not lease_id:
+        raise HTTPException(status_code=409, detail="Upload is being completed")
+    try:
+        take = await finalize_take_upload(upload)
+    finally:
+        await release_upload(upload["id"], lease_id)
+    if not take:
+        raise HTTPException(status_code=410, detail="Uploaded video was lost")
+    return take
+
+async def finalize_take_upload(upload: dict) -> Optional[dict]:
+    """Move a finalizing upload into place as its take and mark the session complete.
+
+    Each step can be repeated, so running this again resumes an interrupted
+    completion. The caller must hold the upload's lease. Returns None, after
+    refunding the reserved storage and dropping the session, when the
+    uploaded video no longer exists.
+    """
+    take_id = upload["take_id"]
+    video_key = f"takes/{take_id}/original.{VIDEO_EXTENSIONS[upload['content_type']]}"
+    source, destination = blob_path(upload["blob_key"]), blob_path(video_key)
+    if source.exists():
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        # Bytes beyond the acknowledged offset belong to an interrupted chunk
+        with open(source, "r+b") as f:
+            f.truncate(upload["offset"])
+        os.replace(source, destination)
+    
+    take = await db.takes.find_one({"id": take_id}, {"_id": 0})
+    if not take:
+        if not destination.exists():
+            if (await db.take_uploads.delete_one({"id": upload["id"], "status": "finalizing"})).deleted_count:
+                await charge_storage(upload["user_id"], -upload["offset"])
+            return None
+        take = {
+            "id": take_id,
+            "project_id": upload["project_id"],
+            "user_id": upload["user_id"],
+            "take_number": await next_take_number(upload["project_id"], upload["user_id"]),
+            "duration": upload["duration"],
+            "notes": upload["notes"],
+            "is_favorite": False,
+            "video_blob": video_key,
+            "content_type": upload["content_type"],
+            "size_bytes": upload["offset"],
+            "storage_bytes": upload["offset"],
+            "thumbnail_url": None,
+            "created_at": datetime.now(timezone.utc).isoformat()
         }
-        
-    except Exception as e:
-        logging.error(f"Video conversion error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to process video")
+        await db.takes.insert_one(take)
+    await enqueue_job("take_mp4", take_id, {"take_id": take_id})
+    await enqueue_job("take_previews", take_id, {"take_id": take_id})
+    await db.take_uploads.update_one({"id": upload["id"], "status": "finalizing"}, {"$set": {"status": "complete"}})
+    return take
 
 # ============== MEMBERSHIP ==============
 
@@ -2062,11 +4090,14 @@ MEMBERSHIP_TIERS = {
     "free": MembershipTier(
         tier="free",
         cloud_storage_mb=0,
+        storage_mb=500,
+        takes_per_project=5,
         features=["download_to_device", "5_takes_per_project", "basic_ai_analysis"]
     ),
     "pro": MembershipTier(
         tier="pro",
         cloud_storage_mb=5000,  # 5GB
+        storage_mb=5000,
         features=["unlimited_cloud_storage", "unlimited_takes", "advanced_ai_analysis", "direct_submission", "share_links", "priority_support"]
     )
 }
@@ -2089,11 +4120,16 @@ async def get_membership_status(current_user: dict = Depends(get_current_user)):
     })
     
     tier_info = MEMBERSHIP_TIERS.get(membership.get("tier", "free"))
+    membership = {
+        **membership,
+        "cloud_storage_used_mb": round(user.get("storage_used_bytes", 0) / MB, 1),
+        "storage_limit_mb": user_tier(user).storage_mb
+    }
     
     return {
         "membership": membership,
         "tier_info": tier_info,
-        "cloud_configured": CLOUDINARY_CONFIGURED
+        "cloud_configured": storage_provider.configured
     }
 
 @api_router.post("/membership/upgrade")
@@ -2131,7 +4167,7 @@ async def get_cloudinary_signature(
     current_user: dict = Depends(get_current_user)
 ):
     """Get signed upload params for Cloudinary (Pro members only)."""
-    if not CLOUDINARY_CONFIGURED:
+    if not storage_provider.configured:
         raise HTTPException(status_code=503, detail="Cloud storage not configured")
     
     # Check membership
@@ -2150,16 +4186,13 @@ async def get_cloudinary_signature(
         "resource_type": resource_type
     }
     
-    signature = cloudinary.utils.api_sign_request(
-        params,
-        os.environ.get("CLOUDINARY_API_SECRET")
-    )
+    signature = storage_provider.sign_upload(params)
     
     return CloudUploadSignature(
         signature=signature,
         timestamp=timestamp,
-        cloud_name=os.environ.get("CLOUDINARY_CLOUD_NAME"),
-        api_key=os.environ.get("CLOUDINARY_API_KEY"),
+        cloud_name=storage_provider.cloud_name,
+        api_key=storage_provider.api_key,
         folder=folder,
         resource_type=resource_type
     )
@@ -2192,6 +4225,63 @@ async def upload_take_to_cloud(
 
 # ============== SHARE/SUBMISSION ==============
 
+def share_expiry(share: dict) -> datetime:
+    """A share's expiry as an aware datetime (Mongo hands back naive UTC dates)."""
+    expires_at = share["expires_at"]
+    if isinstance(expires_at, str):
+        # Shares created before expiry was stored as a date
+        return datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
+    return expires_at.replace(tzinfo=timezone.utc)
+
+def share_response(share: dict) -> ShareResponse:
+    return ShareResponse(**{**share, "expires_at": share_expiry(share).isoformat()})
+
+async def migrate_share_expiry():
+    """Convert ISO-string share expiries to dates so the TTL index covers them."""
+    migrated = 0
+    async for share in db.shares.find({"expires_at": {"$type": "string"}}, {"_id": 0, "id": 1, "expires_at": 1}):
+        await db.shares.update_one(
+            {"id": share["id"], "expires_at": share["expires_at"]},
+            {"$set": {"expires_at": share_expiry(share)}}
+        )
+        migrated += 1
+    if migrated:
+        logging.info(f"Converted expiry of {migrated} shares to dates")
+
+LEGACY_SHARE_TOKEN = re.compile(r"[0-9a-f]{16}")
+
+def sign_share_token(share_hex: str, expires: int) -> str:
+    message = f"share:{share_hex}:{expires}".encode()
+    return hmac.new(JWT_SECRET.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+def make_share_token(share_id: str, expires_at: datetime) -> str:
+    """Build a share token that carries its share id and expiry, signed."""
+    share_hex = uuid.UUID(share_id).hex
+    expires = int(expires_at.timestamp())
+    return f"{share_hex}.{expires}.{sign_share_token(share_hex, expires)}"
+
+def verify_share_token(token: str) -> Optional[str]:
+    """Check a share token without touching the database.
+
+    Returns the share id for signed tokens and None for legacy random
+    tokens, which can only be checked by lookup. Raises 404 for forged or
+    malformed tokens and 410 once the embedded expiry has passed.
+    """
+    if LEGACY_SHARE_TOKEN.fullmatch(token):
+        return None
+    share_hex, _, rest = token.partition(".")
+    expires_text, _, signature = rest.partition(".")
+    if (
+        not re.fullmatch(r"[0-9a-f]{32}", share_hex)
+        or not SIGNED_EXPIRY.fullmatch(expires_text)
+        or not SIGNATURE.fullmatch(signature)
+        or not hmac.compare_digest(signature, sign_share_token(share_hex, int(expires_text)))
+    ):
+        raise HTTPException(status_code=404, detail="Share link not found")
+    if int(expires_text) < time.time():
+        raise HTTPException(status_code=410, detail="Share link has expired")
+    return str(uuid.UUID(share_hex))
+
 @api_router.post("/projects/{project_id}/takes/{take_id}/share", response_model=ShareResponse)
 async def create_share_link(
     project_id: str,
@@ -2209,9 +4299,9 @@ async def create_share_link(
     project = await db.projects.find_one({"id": project_id}, {"_id": 0})
     
     share_id = str(uuid.uuid4())
-    share_token = str(uuid.uuid4()).replace("-", "")[:16]
     now = datetime.now(timezone.utc)
     expires_at = now + timedelta(hours=share_data.expires_hours)
+    share_token = make_share_token(share_id, expires_at)
     
     # Get base URL for share link - use APP_URL for production deployment
     base_url = os.environ.get("FRONTEND_URL") or os.environ.get("APP_URL", "")
@@ -2228,49 +4318,281 @@ async def create_share_link(
         "message": share_data.message,
         "project_title": project.get("title", "Audition Tape"),
         "views": 0,
-        "expires_at": expires_at.isoformat(),
+        "expires_at": expires_at,
         "created_at": now.isoformat()
     }
     
     await db.shares.insert_one(share_doc)
-    
-    return ShareResponse(**share_doc)
+    await record_share_summaries([share_doc])
+    await enqueue_job("take_hls", take_id, {"take_id": take_id})
+    
+    return share_response(share_doc)
+
+VIEW_FLUSH_SECONDS = float(os.environ.get("VIEW_FLUSH_SECONDS", "10"))
+VIEW_FLUSH_THRESHOLD = int(os.environ.get("VIEW_FLUSH_THRESHOLD", "100"))
+
+# Hourly buckets back short-range charts; daily ones are kept indefinitely
+STATS_HOURLY_RETENTION_DAYS = int(os.environ.get("STATS_HOURLY_RETENTION_DAYS", "90"))
+
+def stats_bucket_ops(share_id: str, take_id: str, hour: datetime, views: int) -> List[UpdateOne]:
+    """Upserts adding views to the hourly and daily buckets of a share and its take."""
+    day = hour.replace(hour=0)
+    ops = []
+    for scope, key in (("share", share_id), ("take", take_id)):
+        for granularity, bucket in (("hour", hour), ("day", day)):
+            on_insert = {"share_id": share_id, "take_id": take_id} if scope == "share" else {"take_id": take_id}
+            if granularity == "hour":
+                on_insert["expires_at"] = hour + timedelta(days=STATS_HOURLY_RETENTION_DAYS)
+            ops.append(UpdateOne(
+                {"scope": scope, "key": key, "granularity": granularity, "bucket": bucket},
+                {"$inc": {"views": views}, "$setOnInsert": on_insert},
+                upsert=True
+            ))
+    return ops
+
+def share_summary_key(share_id: str) -> dict:
+    return {"scope": "share", "key": share_id, "granularity": "total", "bucket": None}
+
+async def record_share_summaries(share_docs: List[dict]):
+    """Create the analytics summaries of new shares.
+
+    A summary keeps the recipient and view totals of a share after the share
+    itself expires, so a take's analytics still list it.
+    """
+    await db.share_stats.bulk_write(
+        [
+            UpdateOne(
+                share_summary_key(share["id"]),
+                {
+                    "$set": {
+                        "share_id": share["id"],
+                        "take_id": share["take_id"],
+                        "recipient_name": share.get("recipient_name"),
+                        "recipient_email": share.get("recipient_email"),
+                        "share_expires_at": share["expires_at"],
+                        "created_at": share["created_at"]
+                    },
+                    "$setOnInsert": {"views": 0}
+                },
+                upsert=True
+            )
+            for share in share_docs
+        ],
+        ordered=False
+    )
 
-@api_router.get("/shared/{share_token}")
-async def get_shared_take(share_token: str):
-    """Get a shared take by token (public endpoint)."""
-    share = await db.shares.find_one({"share_token": share_token}, {"_id": 0})
+def summary_ops(buckets: Dict[tuple, int], seen: Dict[str, List[datetime]]) -> List[UpdateOne]:
+    """Upserts adding flushed views and view times to share summaries."""
+    totals: Dict[tuple, int] = {}
+    for (share_id, take_id, _), views in buckets.items():
+        totals[(share_id, take_id)] = totals.get((share_id, take_id), 0) + views
+    ops = []
+    for (share_id, take_id), views in totals.items():
+        update = {"$inc": {"views": views}, "$setOnInsert": {"share_id": share_id, "take_id": take_id}}
+        if share_id in seen:
+            update["$min"] = {"first_viewed_at": seen[share_id][0]}
+            update["$max"] = {"last_viewed_at": seen[share_id][1]}
+        ops.append(UpdateOne(share_summary_key(share_id), update, upsert=True))
+    return ops
+
+class ShareViewCounter:
+    """Write-behind buffer for share view counts.
+
+    Views are summed in memory per share and per hour, and written with one
+    bulk write per flush (share counters plus analytics buckets), on an
+    interval or once enough views are pending. A failed flush puts its
+    counts back, so views are written at least once.
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, int] = {}
+        self.flushing: Dict[str, int] = {}
+        # (share_id, take_id, hour) -> views, plus first/last view time per share
+        self.pending_buckets: Dict[tuple, int] = {}
+        self.pending_seen: Dict[str, List[datetime]] = {}
+        self.total_pending = 0
+        self.flush_lock = asyncio.Lock()
+        self.threshold_flush: Optional[asyncio.Task] = None
+
+    def record(self, share_id: str, take_id: str):
+        now = datetime.now(timezone.utc)
+        bucket = (share_id, take_id, now.replace(minute=0, second=0, microsecond=0))
+        self.pending_buckets[bucket] = self.pending_buckets.get(bucket, 0) + 1
+        seen = self.pending_seen.setdefault(share_id, [now, now])
+        seen[1] = now
+        self.pending[share_id] = self.pending.get(share_id, 0) + 1
+        self.total_pending += 1
+        if self.total_pending >= VIEW_FLUSH_THRESHOLD and not (self.threshold_flush and not self.threshold_flush.done()):
+            self.threshold_flush = asyncio.create_task(self.flush())
+
+    def unflushed(self, share_id: str) -> int:
+        """Views recorded for a share that are not in the database yet."""
+        return self.pending.get(share_id, 0) + self.flushing.get(share_id, 0)
+
+    def restore_counts(self, counts: Dict[str, int], seen: Dict[str, List[datetime]]):
+        for share_id, count in counts.items():
+            self.pending[share_id] = self.pending.get(share_id, 0) + count
+            self.total_pending += count
+        for share_id, (first, last) in seen.items():
+            current = self.pending_seen.setdefault(share_id, [first, last])
+            current[0], current[1] = min(current[0], first), max(current[1], last)
+
+    def restore_buckets(self, buckets: Dict[tuple, int]):
+        for bucket, views in buckets.items():
+            self.pending_buckets[bucket] = self.pending_buckets.get(bucket, 0) + views
+
+    async def flush(self):
+        async with self.flush_lock:
+            if not self.pending and not self.pending_buckets:
+                return
+            self.flushing, self.pending, self.total_pending = self.pending, {}, 0
+            buckets, self.pending_buckets = self.pending_buckets, {}
+            seen, self.pending_seen = self.pending_seen, {}
+            try:
+                if self.flushing:
+                    await db.shares.bulk_write(
+                        [
+                            UpdateOne({"id": share_id}, {
+                                "$inc": {"views": count},
+                                "$min": {"first_viewed_at": seen[share_id][0]},
+                                "$max": {"last_viewed_at": seen[share_id][1]}
+                            })
+                            for share_id, count in self.flushing.items()
+                        ],
+                        ordered=False
+                    )
+            except (Exception, asyncio.CancelledError) as e:
+                self.restore_counts(self.flushing, seen)
+                self.restore_buckets(buckets)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                logging.error(f"Flushing {len(self.flushing)} share view counts failed: {e}")
+                return
+            finally:
+                self.flushing = {}
+            # Counters are written; only the analytics buckets are retried from here
+            try:
+                await db.share_stats.bulk_write(
+                    [op for (share_id, take_id, hour), views in buckets.items() for op in stats_bucket_ops(share_id, take_id, hour, views)]
+                    + summary_ops(buckets, seen),
+                    ordered=False
+                )
+            except (Exception, asyncio.CancelledError) as e:
+                # View times are re-applied with $min/$max, so restoring them is safe
+                self.restore_counts({}, seen)
+                self.restore_buckets(buckets)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                logging.error(f"Flushing {len(buckets)} share analytics buckets failed: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(VIEW_FLUSH_SECONDS)
+            await self.flush()
+
+share_views = ShareViewCounter()
+
+SHARE_CACHE_SECONDS = int(os.environ.get("SHARE_CACHE_SECONDS", "60"))
+SHARE_CACHE_SIZE = int(os.environ.get("SHARE_CACHE_SIZE", "2000"))
+
+class SharePayloadCache:
+    """In-process TTL cache of resolved public share payloads, keyed by token.
+
+    Entries never outlive their share and are dropped when the share or its
+    take changes in this process; other processes catch up within
+    SHARE_CACHE_SECONDS.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, dict] = {}
+
+    def get(self, token: str) -> Optional[dict]:
+        entry = self.entries.get(token)
+        if entry and entry["cached_until"] < time.time():
+            self.entries.pop(token, None)
+            return None
+        return entry
+
+    def put(self, token: str, entry: dict):
+        self.entries.pop(token, None)
+        while len(self.entries) >= SHARE_CACHE_SIZE:
+            self.entries.pop(next(iter(self.entries)))
+        self.entries[token] = entry
+
+    def invalidate(self, share_id: Optional[str] = None, take_id: Optional[str] = None):
+        for token, entry in list(self.entries.items()):
+            if entry["share_id"] == share_id or entry["take_id"] == take_id:
+                self.entries.pop(token, None)
+
+share_cache = SharePayloadCache()
+
+async def resolve_share(share_token: str) -> dict:
+    """Look up a live share and its take and build the public payload."""
+    share_id = verify_share_token(share_token)
+    query = {"id": share_id, "share_token": share_token} if share_id else {"share_token": share_token}
+    share = await db.shares.find_one(query, {"_id": 0})
     if not share:
         raise HTTPException(status_code=404, detail="Share link not found")
     
-    # Check expiration
-    expires_at = datetime.fromisoformat(share["expires_at"].replace("Z", "+00:00"))
+    # The TTL monitor only runs once a minute, so check expiration here too
+    expires_at = share_expiry(share)
     if datetime.now(timezone.utc) > expires_at:
         raise HTTPException(status_code=410, detail="Share link has expired")
     
-    # Increment views
-    await db.shares.update_one(
-        {"share_token": share_token},
-        {"$inc": {"views": 1}}
-    )
-    
     # Get the take
     take = await db.takes.find_one({"id": share["take_id"]}, {"_id": 0})
     if not take:
         raise HTTPException(status_code=404, detail="Take not found")
     
-    return {
+    payload = {
         "project_title": share.get("project_title", "Audition Tape"),
         "recipient_name": share.get("recipient_name"),
         "message": share.get("message"),
         "take": {
             "take_number": take["take_number"],
             "duration": take["duration"],
-            "video_url": take.get("cloud_url") or take.get("video_url"),
-            "notes": take.get("notes")
+            "video_url": take.get("cloud_url") or take_video_url(take, expires_at),
+            "playlist_url": take_playlist_url(take, expires_at),
+            "notes": take.get("notes"),
+            **take_preview_fields(take, expires_at)
         },
-        "views": share["views"] + 1,
-        "expires_at": share["expires_at"]
+        "expires_at": expires_at.isoformat()
+    }
+    return {
+        "share_id": share["id"],
+        "take_id": take["id"],
+        "expires_at": expires_at.timestamp(),
+        "cached_until": min(time.time() + SHARE_CACHE_SECONDS, expires_at.timestamp()),
+        "payload": payload,
+        # View counts change on every hit, so the validator covers everything else
+        "etag": f'W/"{hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:32]}"',
+        # Counted up by each hit served from this entry
+        "views": share["views"] + share_views.unflushed(share["id"]),
+    }
+
+@api_router.get("/shared/{share_token}", dependencies=[Depends(limit_share_requests)])
+async def get_shared_take(share_token: str, request: Request, response: Response):
+    """Get a shared take by token (public endpoint)."""
+    entry = share_cache.get(share_token)
+    if entry is None:
+        entry = await resolve_share(share_token)
+        share_cache.put(share_token, entry)
+    elif time.time() > entry["expires_at"]:
+        raise HTTPException(status_code=410, detail="Share link has expired")
+    
+    share_views.record(entry["share_id"], entry["take_id"])
+    entry["views"] += 1
+    
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": f"public, max-age={max(0, min(SHARE_CACHE_SECONDS, int(entry['expires_at'] - time.time())))}"
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"].removeprefix("W/")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {
+        **entry["payload"],
+        "views": entry["views"]
     }
 
 @api_router.get("/projects/{project_id}/takes/{take_id}/shares", response_model=List[ShareResponse])
@@ -2280,12 +4602,98 @@ async def get_take_shares(
     current_user: dict = Depends(get_current_user)
 ):
     """Get all share links for a take."""
+    # Legacy shares with ISO-string expiries don't match a date $gt, so they
+    # stay hidden here until migrate_share_expiry has converted them
     shares = await db.shares.find(
-        {"take_id": take_id, "user_id": current_user["id"]},
+        {"take_id": take_id, "user_id": current_user["id"], "expires_at": {"$gt": datetime.now(timezone.utc)}},
         {"_id": 0}
     ).sort("created_at", -1).to_list(50)
     
-    return [ShareResponse(**s) for s in shares]
+    return [share_response({**s, "views": s["views"] + share_views.unflushed(s["id"])}) for s in shares]
+
+@api_router.get("/projects/{project_id}/takes/{take_id}/analytics")
+async def get_take_analytics(
+    project_id: str,
+    take_id: str,
+    granularity: Literal["hour", "day"] = Query("day"),
+    days: int = Query(14, ge=1, le=365),
+    current_user: dict = Depends(get_current_user)
+):
+    """Views over time for a take and each of its share links, from pre-aggregated buckets."""
+    take = await db.takes.find_one(
+        {"id": take_id, "project_id": project_id, "user_id": current_user["id"]},
+        {"_id": 0, "id": 1}
+    )
+    if not take:
+        raise HTTPException(status_code=404, detail="Take not found")
+    
+    now = datetime.now(timezone.utc)
+    since = (now - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        since = since.replace(hour=0)
+    
+    # Summaries outlive their shares, so expired links stay in the history;
+    # live shares have the freshest counts
+    summaries = {
+        summary["share_id"]: summary
+        async for summary in db.share_stats.find(
+            {"take_id": take_id, "scope": "share", "granularity": "total"},
+            {"_id": 0}
+        ).sort("created_at", -1).limit(100)
+    }
+    live = {
+        share["id"]: share
+        async for share in db.shares.find(
+            {"take_id": take_id, "user_id": current_user["id"]},
+            {"_id": 0, "id": 1, "recipient_name": 1, "recipient_email": 1, "views": 1,
+             "first_viewed_at": 1, "last_viewed_at": 1, "expires_at": 1, "created_at": 1}
+        ).sort("created_at", -1).limit(100)
+    }
+    shares = []
+    for share_id in dict.fromkeys([*live, *summaries]):
+        summary, share = summaries.get(share_id, {}), live.get(share_id)
+        shares.append({
+            "share_id": share_id,
+            "recipient_name": (share or summary).get("recipient_name"),
+            "recipient_email": (share or summary).get("recipient_email"),
+            "views": (share or summary).get("views", 0) + share_views.unflushed(share_id),
+            "first_viewed_at": (share or summary).get("first_viewed_at"),
+            "last_viewed_at": (share or summary).get("last_viewed_at"),
+            "expires_at": share_expiry(share) if share else summary.get("share_expires_at"),
+            "active": share is not None,
+            "created_at": (share or summary).get("created_at", "")
+        })
+    shares.sort(key=lambda share: share["created_at"], reverse=True)
+    
+    series: Dict[str, List[dict]] = {}
+    async for bucket in db.share_stats.find(
+        {"take_id": take_id, "granularity": granularity, "bucket": {"$gte": since}},
+        {"_id": 0, "scope": 1, "key": 1, "bucket": 1, "views": 1}
+    ).sort("bucket", 1):
+        series_key = "take" if bucket["scope"] == "take" else bucket["key"]
+        series.setdefault(series_key, []).append({
+            "bucket": bucket["bucket"].replace(tzinfo=timezone.utc).isoformat(),
+            "views": bucket["views"]
+        })
+    
+    def iso(value: Optional[datetime]) -> Optional[str]:
+        return value.replace(tzinfo=timezone.utc).isoformat() if value else None
+    
+    return {
+        "granularity": granularity,
+        "since": since.isoformat(),
+        "views": series.get("take", []),
+        "shares": [
+            {
+                **share,
+                "first_viewed_at": iso(share["first_viewed_at"]),
+                "last_viewed_at": iso(share["last_viewed_at"]),
+                "expires_at": iso(share["expires_at"]),
+                "series": series.get(share["share_id"], [])
+            }
+            for share in shares
+        ]
+    }
 
 @api_router.delete("/shares/{share_id}")
 async def delete_share(share_id: str, current_user: dict = Depends(get_current_user)):
@@ -2293,6 +4701,7 @@ async def delete_share(share_id: str, current_user: dict = Depends(get_current_u
     result = await db.shares.delete_one({"id": share_id, "user_id": current_user["id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Share not found")
+    share_cache.invalidate(share_id=share_id)
     
     return {"message": "Share link deleted"}
 
@@ -2314,42 +4723,95 @@ async def direct_submission(
     user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0})
     
     # Create share link
-    share_id = str(uuid.uuid4())
-    share_token = str(uuid.uuid4()).replace("-", "")[:16]
-    now = datetime.now(timezone.utc)
-    expires_at = now + timedelta(hours=72)
+    share_doc = submission_share(take_id, project_id, project, current_user["id"], submission)
+    # The email goes out from the outbox; the actor doesn't wait on the provider
+    email_queued = email_provider.configured
+    if email_queued:
+        share_doc["pending_email"] = submission_email(share_doc, user, project)
+    await db.shares.insert_one(share_doc)
+    await record_share_summaries([share_doc])
+    await queue_share_emails([share_doc])
+    await enqueue_job("take_hls", take_id, {"take_id": take_id})
     
-    # Get base URL for share link - use APP_URL for production deployment
-    base_url = os.environ.get("FRONTEND_URL") or os.environ.get("APP_URL", "")
-    share_url = f"{base_url}/shared/{share_token}"
+    return DirectSubmissionResponse(
+        status="success",
+        message=f"Self-tape submitted to {submission.recipient_name}" + (" via email" if email_queued else " (link created)"),
+        share_url=share_doc["share_url"],
+        email_sent=False,
+        email_queued=email_queued
+    )
+
+@api_router.post("/projects/{project_id}/takes/{take_id}/submit/bulk", response_model=BulkSubmissionResponse)
+async def bulk_submission(
+    project_id: str,
+    take_id: str,
+    bulk: BulkSubmissionRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Send a take to several recipients at once, each with their own share link."""
+    take = await db.takes.find_one(
+        {"id": take_id, "project_id": project_id, "user_id": current_user["id"]},
+        {"_id": 0, "id": 1}
+    )
+    if not take:
+        raise HTTPException(status_code=404, detail="Take not found")
     
-    share_doc = {
-        "id": share_id,
-        "take_id": take_id,
-        "project_id": project_id,
-        "user_id": current_user["id"],
-        "share_token": share_token,
-        "share_url": share_url,
-        "recipient_email": submission.recipient_email,
-        "recipient_name": submission.recipient_name,
-        "message": submission.message,
-        "project_title": project.get("title", "Audition Tape"),
-        "views": 0,
-        "expires_at": expires_at.isoformat(),
-        "created_at": now.isoformat(),
-        "email_sent": False
+    project = await db.projects.find_one({"id": project_id}, {"_id": 0, "title": 1})
+    
+    share_docs = [
+        submission_share(take_id, project_id, project, current_user["id"], recipient.model_copy(update={"message": recipient.message or bulk.message}))
+        for recipient in bulk.recipients
+    ]
+    email_queued = email_provider.configured
+    if email_queued:
+        for share_doc in share_docs:
+            share_doc["pending_email"] = submission_email(share_doc, current_user, project)
+    await db.shares.insert_many(share_docs)
+    await record_share_summaries(share_docs)
+    await queue_share_emails(share_docs)
+    await enqueue_job("take_hls", take_id, {"take_id": take_id})
+    
+    return BulkSubmissionResponse(
+        status="success",
+        message=f"Self-tape submitted to {len(share_docs)} recipients" + (" via email" if email_queued else " (links created)"),
+        submissions=[
+            BulkSubmissionResult(
+                recipient_email=share_doc["recipient_email"],
+                recipient_name=share_doc["recipient_name"],
+                share_url=share_doc["share_url"]
+            )
+            for share_doc in share_docs
+        ],
+        email_queued=email_queued
+    )
+
+@api_router.get("/email/status")
+async def get_email_status():
+    """Check if email sending is configured."""
+    return {
+        "configured": email_provider.configured,
+        "sender_email": email_provider.sender if email_provider.configured else None
     }
-    
-    await db.shares.insert_one(share_doc)
-    
-    # Send email via Resend
-    email_sent = False
-    if RESEND_CONFIGURED:
-        try:
-            actor_name = user.get("name", "An Actor")
-            project_title = project.get("title", "Self-Tape Audition")
-            
-            html_content = f"""
+
+# ============== EMAIL OUTBOX ==============
+
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = 30
+EMAIL_LEASE_SECONDS = 120
+EMAIL_POLL_SECONDS = float(os.environ.get("EMAIL_POLL_SECONDS", "5"))
+# Emails still on their share after this long were stranded by a crash
+EMAIL_HANDOFF_GRACE_MINUTES = 10
+email_wakeup = asyncio.Event()
+
+def submission_email_params(
+    actor_name: str,
+    project_title: str,
+    recipient_name: str,
+    recipient_email: str,
+    message: Optional[str],
+    share_url: str
+) -> dict:
+    html_content = f"""
             <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
                 <div style="background: linear-gradient(135deg, #9333ea 0%, #ec4899 100%); padding: 30px; border-radius: 12px 12px 0 0;">
                     <h1 style="color: white; margin: 0; font-size: 24px;">CuePartner</h1>
@@ -2358,7 +4820,7 @@ async def direct_submission(
                 
                 <div style="background: #1a1a1a; padding: 30px; border-radius: 0 0 12px 12px; color: #ffffff;">
                     <p style="font-size: 18px; margin: 0 0 20px 0;">
-                        Hi {submission.recipient_name},
+                        Hi {recipient_name},
                     </p>
                     
                     <p style="color: #a1a1aa; line-height: 1.6;">
@@ -2366,7 +4828,7 @@ async def direct_submission(
                         for <strong style="color: #c084fc;">"{project_title}"</strong>.
                     </p>
                     
-                    {f'<div style="background: #262626; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 3px solid #9333ea;"><p style="color: #a1a1aa; margin: 0; font-style: italic;">"{submission.message}"</p></div>' if submission.message else ''}
+                    {f'<div style="background: #262626; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 3px solid #9333ea;"><p style="color: #a1a1aa; margin: 0; font-style: italic;">"{message}"</p></div>' if message else ''}
                     
                     <div style="text-align: center; margin: 30px 0;">
                         <a href="{share_url}" style="background: linear-gradient(135deg, #9333ea 0%, #ec4899 100%); color: white; padding: 14px 32px; border-radius: 8px; text-decoration: none; font-weight: bold; display: inline-block;">
@@ -2384,44 +4846,376 @@ async def direct_submission(
                 </p>
             </div>
             """
-            
-            params = {
-                "from": SENDER_EMAIL,
-                "to": [submission.recipient_email],
-                "subject": f"Self-Tape Submission from {actor_name} - {project_title}",
-                "html": html_content
-            }
-            
-            # Run sync SDK in thread to keep FastAPI non-blocking
-            await asyncio.to_thread(resend.Emails.send, params)
-            email_sent = True
-            
-            # Update share doc with email sent status
-            await db.shares.update_one(
-                {"id": share_id},
-                {"$set": {"email_sent": True}}
+    return {
+        "from": email_provider.sender,
+        "to": [recipient_email],
+        "subject": f"Self-Tape Submission from {actor_name} - {project_title}",
+        "html": html_content
+    }
+
+def submission_share(take_id: str, project_id: str, project: dict, user_id: str, submission: DirectSubmissionRequest) -> dict:
+    """Build the share document for one submission recipient."""
+    share_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(hours=72)
+    share_token = make_share_token(share_id, expires_at)
+    
+    # Get base URL for share link - use APP_URL for production deployment
+    base_url = os.environ.get("FRONTEND_URL") or os.environ.get("APP_URL", "")
+    
+    return {
+        "id": share_id,
+        "take_id": take_id,
+        "project_id": project_id,
+        "user_id": user_id,
+        "share_token": share_token,
+        "share_url": f"{base_url}/shared/{share_token}",
+        "recipient_email": submission.recipient_email,
+        "recipient_name": submission.recipient_name,
+        "message": submission.message,
+        "project_title": project.get("title", "Audition Tape"),
+        "views": 0,
+        "expires_at": expires_at,
+        "created_at": now.isoformat(),
+        "email_sent": False,
+        "email_status": "queued" if email_provider.configured else None
+    }
+
+def submission_email(share_doc: dict, user: dict, project: dict) -> dict:
+    return outbox_email(share_doc["id"], submission_email_params(
+        actor_name=user.get("name", "An Actor"),
+        project_title=project.get("title", "Self-Tape Audition"),
+        recipient_name=share_doc["recipient_name"],
+        recipient_email=share_doc["recipient_email"],
+        message=share_doc["message"],
+        share_url=share_doc["share_url"]
+    ))
+
+def outbox_email(share_id: str, params: dict) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": str(uuid.uuid4()),
+        "share_id": share_id,
+        "params": params,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now
+    }
+
+async def queue_share_emails(share_docs: List[dict]):
+    """Move the emails carried by new shares into the outbox.
+
+    A submission share is inserted with its email embedded (Mongo isn't
+    assumed to be a replica set, so there is no transaction to span both
+    collections). If this step is interrupted the email stays on the share,
+    and gc_sweep hands it over later; the outbox's unique id makes the
+    hand-off safe to repeat.
+    """
+    emails = [share.pop("pending_email") for share in share_docs if share.get("pending_email")]
+    if not emails:
+        return
+    try:
+        await db.email_outbox.insert_many(emails, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+    await db.shares.update_many(
+        {"id": {"$in": [email["share_id"] for email in emails]}},
+        {"$unset": {"pending_email": ""}}
+    )
+    email_wakeup.set()
+
+def is_retryable_email_error(error: ProviderError) -> bool:
+    try:
+        status_code = int(error.status_code) if error.status_code is not None else None
+    except (TypeError, ValueError):
+        status_code = None
+    return status_code is None or status_code == 429 or status_code >= 500
+
+async def claim_email_batch() -> List[dict]:
+    """Lease up to one provider batch of due emails."""
+    now = datetime.now(timezone.utc)
+    due = {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now}},
+        {"status": "sending", "lease_until": {"$lt": now}},
+    ]}
+    ids = [e["id"] for e in await db.email_outbox.find(due, {"_id": 0, "id": 1}).sort("next_attempt_at", 1).to_list(email_provider.max_batch)]
+    if not ids:
+        return []
+    lease_id = str(uuid.uuid4())
+    await db.email_outbox.update_many(
+        {"id": {"$in": ids}, **due},
+        {"$set": {"status": "sending", "lease_id": lease_id, "lease_until": now + timedelta(seconds=EMAIL_LEASE_SECONDS)}, "$inc": {"attempts": 1}}
+    )
+    return await db.email_outbox.find({"lease_id": lease_id}, {"_id": 0}).to_list(len(ids))
+
+async def deliver_email_batch(batch: List[dict]):
+    try:
+        results = await email_provider.send_batch([e["params"] for e in batch])
+    except ProviderError as e:
+        if len(batch) > 1 and not is_retryable_email_error(e):
+            # A single bad address rejects the whole batch; send one by one
+            # so only the offending emails fail
+            for email in batch:
+                await deliver_email_batch([email])
+            return
+        now = datetime.now(timezone.utc)
+        for email in batch:
+            failed = email["attempts"] >= EMAIL_MAX_ATTEMPTS or not is_retryable_email_error(e)
+            await db.email_outbox.update_one(
+                {"id": email["id"], "lease_id": email["lease_id"]},
+                {"$set": {
+                    "status": "failed" if failed else "pending",
+                    "last_error": str(e)[:500],
+                    "next_attempt_at": now + timedelta(seconds=EMAIL_RETRY_BASE_SECONDS * 2 ** (email["attempts"] - 1))
+                }}
             )
-            
-            logging.info(f"Email sent successfully to {submission.recipient_email}")
-            
+            if failed:
+                await db.shares.update_one({"id": email["share_id"]}, {"$set": {"email_status": "failed"}})
+        logging.error(f"Sending {len(batch)} emails failed (attempt {batch[0]['attempts']}): {e}")
+        return
+    
+    now = datetime.now(timezone.utc)
+    for email, result in itertools.zip_longest(batch, results or []):
+        if email is None:
+            break
+        await db.email_outbox.update_one(
+            {"id": email["id"], "lease_id": email["lease_id"]},
+            {"$set": {"status": "sent", "sent_at": now, "provider_id": (result or {}).get("id")}}
+        )
+    await db.shares.update_many(
+        {"id": {"$in": [e["share_id"] for e in batch]}},
+        {"$set": {"email_sent": True, "email_status": "sent"}}
+    )
+    logging.info(f"Sent {len(batch)} emails")
+
+async def email_sender():
+    while True:
+        try:
+            batch = await claim_email_batch()
         except Exception as e:
-            logging.error(f"Failed to send email: {str(e)}")
-            # Continue even if email fails - share link is still created
+            logging.error(f"Email outbox claim failed: {e}")
+            batch = []
+        if batch:
+            try:
+                await deliver_email_batch(batch)
+                continue
+            except Exception as e:
+                # The claimed rows come back once their lease runs out
+                logging.error(f"Email delivery failed: {e}")
+        email_wakeup.clear()
+        try:
+            await asyncio.wait_for(email_wakeup.wait(), timeout=EMAIL_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+# ============== GARBAGE COLLECTION ==============
+
+GC_INTERVAL_HOURS = float(os.environ.get("GC_INTERVAL_HOURS", "6"))
+GC_BATCH_SIZE = int(os.environ.get("GC_BATCH_SIZE", "50"))
+GC_BATCH_PAUSE_SECONDS = float(os.environ.get("GC_BATCH_PAUSE_SECONDS", "1"))
+# Blobs younger than this are never swept, so in-flight writes are safe
+GC_BLOB_GRACE_HOURS = float(os.environ.get("GC_BLOB_GRACE_HOURS", "24"))
+GC_JOB_RETENTION_DAYS = 7
+GC_EMAIL_RETENTION_DAYS = 7
+
+async def gc_pause(count: int):
+    """Yield to request traffic after every GC_BATCH_SIZE deletions."""
+    if count and count % GC_BATCH_SIZE == 0:
+        await asyncio.sleep(GC_BATCH_PAUSE_SECONDS)
+
+async def purge_take(take_id: str, cloud_public_id: Optional[str] = None):
+    """Remove everything hanging off a deleted take."""
+    await db.shares.delete_many({"take_id": take_id})
+    await db.share_stats.delete_many({"take_id": take_id})
+    share_cache.invalidate(take_id=take_id)
+    await asyncio.to_thread(shutil.rmtree, blob_path(f"takes/{take_id}"), True)
+    if cloud_public_id and storage_provider.configured:
+        try:
+            await storage_provider.destroy(cloud_public_id)
+        except ProviderError as e:
+            logging.warning(f"Could not delete cloud copy of take {take_id}: {e}")
+
+async def purge_upload(upload: dict):
+    await asyncio.to_thread(blob_path(upload["blob_key"]).unlink, True)
+    await db.take_uploads.delete_one({"id": upload["id"]})
+
+@job_handler("take_cleanup")
+async def cleanup_take(payload: dict) -> None:
+    await purge_take(payload["take_id"], payload.get("cloud_public_id"))
+
+@job_handler("project_cleanup")
+async def cleanup_project(payload: dict) -> dict:
+    """Cascade a project delete to its takes, shares and uploads, in throttled batches."""
+    project_id = payload["project_id"]
+    # Finish interrupted completions first so their reserved storage is
+    # refunded along with the takes below
+    async for upload in db.take_uploads.find({"project_id": project_id, "status": "finalizing"}, {"_id": 0}):
+        lease_id = await lease_upload(upload["id"], {"status": "finalizing"})
+        if lease_id:
+            try:
+                await finalize_take_upload(upload)
+            finally:
+                await release_upload(upload["id"], lease_id)
+    removed = 0
+    while True:
+        takes = await db.takes.find(
+            {"project_id": project_id}, {"_id": 0, "id": 1, "user_id": 1, "storage_bytes": 1, "cloud_public_id": 1}
+        ).to_list(GC_BATCH_SIZE)
+        if not takes:
+            break
+        for take in takes:
+            if (await db.takes.delete_one({"id": take["id"]})).deleted_count:
+                await charge_storage(take["user_id"], -take.get("storage_bytes", 0))
+            await purge_take(take["id"], take.get("cloud_public_id"))
+            removed += 1
+        await asyncio.sleep(GC_BATCH_PAUSE_SECONDS)
+    
+    async for upload in db.take_uploads.find({"project_id": project_id}, {"_id": 0, "id": 1, "blob_key": 1}):
+        await purge_upload(upload)
+    await db.counters.delete_many({"_id": {"$regex": f"^takes:{re.escape(project_id)}:"}})
+    return {"takes_removed": removed}
+
+def sweep_blob_files(root: Path, keep, grace_seconds: float) -> tuple[int, int]:
+    """Delete files (or take directories) under root that `keep` rejects.
+
+    Anything modified within the grace period is left alone. Returns the
+    number of entries and bytes removed.
+    """
+    if not root.is_dir():
+        return 0, 0
+    cutoff = time.time() - grace_seconds
+    removed = freed = 0
+    for path in root.rglob("*") if root.name == "audio" else root.iterdir():
+        try:
+            stat = path.stat()
+            if stat.st_mtime > cutoff or keep(path):
+                continue
+            if path.is_dir():
+                size = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.is_file():
+                size = stat.st_size
+                path.unlink()
+            else:
+                continue
+        except FileNotFoundError:
+            continue
+        removed += 1
+        freed += size
+    return removed, freed
+
+@job_handler("gc_sweep")
+async def gc_sweep(payload: dict) -> dict:
+    """Find and remove data no live document points at.
+
+    Audio blobs are content-addressed and shared between lines and projects,
+    so they are collected by counting references from every project rather
+    than on delete.
+    """
+    stats = {}
+    
+    # Takes whose project is gone
+    orphan_projects = 0
+    project_ids = await db.takes.distinct("project_id")
+    for start in range(0, len(project_ids), GC_BATCH_SIZE):
+        batch = project_ids[start:start + GC_BATCH_SIZE]
+        live = {p["id"] for p in await db.projects.find({"id": {"$in": batch}}, {"_id": 0, "id": 1}).to_list(len(batch))}
+        for project_id in set(batch) - live:
+            await enqueue_job("project_cleanup", project_id, {"project_id": project_id}, restart=True)
+            orphan_projects += 1
+    stats["orphan_projects"] = orphan_projects
+    
+    # Shares whose take is gone
+    orphan_shares = 0
+    take_ids = await db.shares.distinct("take_id")
+    for start in range(0, len(take_ids), GC_BATCH_SIZE):
+        batch = take_ids[start:start + GC_BATCH_SIZE]
+        live = {t["id"] for t in await db.takes.find({"id": {"$in": batch}}, {"_id": 0, "id": 1}).to_list(len(batch))}
+        dead = list(set(batch) - live)
+        if dead:
+            orphan_shares += (await db.shares.delete_many({"take_id": {"$in": dead}})).deleted_count
+        await asyncio.sleep(GC_BATCH_PAUSE_SECONDS if dead else 0)
+    stats["orphan_shares"] = orphan_shares
+    
+    # Abandoned uploads
+    expired = 0
+    now = datetime.now(timezone.utc).isoformat()
+    async for upload in db.take_uploads.find({"status": "open", "expires_at": {"$lt": now}}, {"_id": 0, "id": 1, "blob_key": 1}):
+        await purge_upload(upload)
+        expired += 1
+        await gc_pause(expired)
+    stats["expired_uploads"] = expired
+    
+    # Completions that were interrupted and never retried
+    finalized = 0
+    async for upload in db.take_uploads.find({"status": "finalizing", "expires_at": {"$lt": now}}, {"_id": 0}):
+        lease_id = await lease_upload(upload["id"], {"status": "finalizing"})
+        if not lease_id:
+            continue
+        try:
+            await finalize_take_upload(upload)
+        finally:
+            await release_upload(upload["id"], lease_id)
+        finalized += 1
+        await gc_pause(finalized)
+    stats["finalized_uploads"] = finalized
+    stats["completed_uploads"] = (
+        await db.take_uploads.delete_many({"status": "complete", "expires_at": {"$lt": now}})
+    ).deleted_count
+    
+    grace = GC_BLOB_GRACE_HOURS * 3600
+    # Take directories without a take document
+    live_takes = set(await db.takes.distinct("id")) | set(await db.take_uploads.distinct("take_id", {"status": "finalizing"}))
+    stats["take_dirs"] = await asyncio.to_thread(
+        sweep_blob_files, BLOB_DIR / "takes", lambda path: path.name in live_takes, grace
+    )
+    live_uploads = set(await db.take_uploads.distinct("id"))
+    stats["upload_files"] = await asyncio.to_thread(
+        sweep_blob_files, BLOB_DIR / "uploads", lambda path: path.name in live_uploads, grace
+    )
     
-    return DirectSubmissionResponse(
-        status="success",
-        message=f"Self-tape submitted to {submission.recipient_name}" + (" via email" if email_sent else " (link created)"),
-        share_url=share_url,
-        email_sent=email_sent
+    # Audio blobs with no referencing line
+    audio_refs: Dict[str, int] = {}
+    async for project in db.projects.find({}, {"_id": 0, "scenes.lines.audio_url": 1, "scenes.lines.audio_renditions": 1}):
+        for scene in project.get("scenes", []):
+            for line in scene.get("lines", []):
+                for key in filter(None, map(audio_blob_key, audio_urls(line))):
+                    audio_refs[key] = audio_refs.get(key, 0) + 1
+    stats["audio_blobs"] = await asyncio.to_thread(
+        sweep_blob_files,
+        BLOB_DIR / "audio",
+        lambda path: path.is_dir() or path.relative_to(BLOB_DIR).as_posix() in audio_refs,
+        grace
     )
+    
+    # Finished jobs only matter for status lookups shortly after they run
+    cutoff = datetime.now(timezone.utc) - timedelta(days=GC_JOB_RETENTION_DAYS)
+    stats["jobs"] = (await db.jobs.delete_many({"status": "done", "finished_at": {"$lt": cutoff}})).deleted_count
+    
+    # Delivered emails only matter while the share's email status is fresh
+    cutoff = datetime.now(timezone.utc) - timedelta(days=GC_EMAIL_RETENTION_DAYS)
+    stats["emails"] = (await db.email_outbox.delete_many({"status": "sent", "sent_at": {"$lt": cutoff}})).deleted_count
+    
+    # Submission emails whose share was saved but never reached the outbox
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=EMAIL_HANDOFF_GRACE_MINUTES)
+    stranded = await db.shares.find(
+        {"pending_email.created_at": {"$lt": cutoff}}, {"_id": 0, "id": 1, "pending_email": 1}
+    ).to_list(None)
+    await queue_share_emails(stranded)
+    stats["stranded_emails"] = len(stranded)
+    
+    logging.info(f"GC sweep finished: {stats}")
+    return stats
 
-@api_router.get("/email/status")
-async def get_email_status():
-    """Check if email sending is configured."""
-    return {
-        "configured": RESEND_CONFIGURED,
-        "sender_email": SENDER_EMAIL if RESEND_CONFIGURED else None
-    }
+async def gc_loop():
+    while True:
+        try:
+            await enqueue_job("gc_sweep", "global", {}, restart=True)
+        except Exception as e:
+            logging.error(f"Scheduling GC sweep failed: {e}")
+        await asyncio.sleep(GC_INTERVAL_HOURS * 3600)
 
 # ============== HEALTH CHECK ==============
 
@@ -2434,10 +5228,16 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "elevenlabs_configured": eleven_client is not None,
-        "ai_configured": EMERGENT_LLM_KEY is not None,
-        "cloud_configured": CLOUDINARY_CONFIGURED,
-        "email_configured": RESEND_CONFIGURED
+        "elevenlabs_configured": tts_provider.configured,
+        "ai_configured": llm_provider.configured,
+        "cloud_configured": storage_provider.configured,
+        "email_configured": email_provider.configured,
+        "providers": {
+            "llm": llm_provider.name,
+            "tts": tts_provider.name,
+            "email": email_provider.name,
+            "storage": storage_provider.name
+        }
     }
 
 # Include the router in the main app
@@ -2450,6 +5250,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def ensure_indexes():
+    # Per-minute TTS character windows clean themselves up
+    await db.provider_quota.create_index("expires_at", expireAfterSeconds=0)
+    await db.takes.create_index([("project_id", 1), ("user_id", 1)] + TAKE_LIST_SORT)
+    await db.jobs.create_index([("kind", 1), ("key", 1)], unique=True)
+    await db.jobs.create_index([("status", 1), ("run_at", 1)])
+    await db.takes.create_index("id")
+    await db.shares.create_index([("take_id", 1), ("user_id", 1), ("expires_at", 1)])
+    await db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.share_stats.create_index([("scope", 1), ("key", 1), ("granularity", 1), ("bucket", 1)], unique=True)
+    await db.share_stats.create_index("expires_at", expireAfterSeconds=0)
+    await db.share_stats.create_index([("take_id", 1), ("granularity", 1), ("bucket", 1)])
+    await db.email_outbox.create_index("lease_id")
+    await db.email_outbox.create_index("id", unique=True)
+    await db.shares.create_index("pending_email.created_at", sparse=True)
+    # Expired share links delete themselves
+    await db.shares.create_index("expires_at", expireAfterSeconds=0)
+    await db.shares.create_index("id")
+    await db.shares.create_index("share_token")
+    # Held with the workers so the task isn't garbage collected mid-run
+    job_worker_tasks.append(asyncio.create_task(migrate_inline_takes()))
+    job_worker_tasks.append(asyncio.create_task(migrate_share_expiry()))
+    job_worker_tasks.extend(asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS))
+    job_worker_tasks.append(asyncio.create_task(storage_reconcile_loop()))
+    job_worker_tasks.append(asyncio.create_task(gc_loop()))
+    job_worker_tasks.append(asyncio.create_task(share_views.run()))
+    job_worker_tasks.append(asyncio.create_task(email_sender()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in job_worker_tasks:
+        task.cancel()
+    # Write out buffered views before the connection goes away
+    await share_views.flush()
     client.close()
@@ -0,0 +1,264 @@
+"""
+CuePartner Backend Helper Tests
+Unit tests for pure helpers in server.py (no running server needed):
+- Range parsing and blob responses - parse_range_header, blob_response
+- Take list cursors - encode_take_cursor, take_cursor_filter
+- Signed share tokens - make_share_token, verify_share_token
+- Waveform peaks - waveform_peaks
+- Public endpoint rate limiting - TokenBucketLimiter, client_ip
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# The Mongo client connects lazily, so importing only needs the settings
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "cuepartner_test")
+
+server = pytest.importorskip("server")
+np = pytest.importorskip("numpy")
+from fastapi import HTTPException
+from starlette.requests import Request
+
+
+def make_request(method="GET", **headers):
+    return Request({
+        "type": "http",
+        "method": method,
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+class TestParseRangeHeader:
+    """Single byte ranges, suffix ranges and rejected ranges"""
+
+    def test_no_header_serves_everything(self):
+        assert server.parse_range_header(None, 100) is None
+        assert server.parse_range_header("items=0-1", 100) is None
+
+    def test_multiple_ranges_are_ignored(self):
+        assert server.parse_range_header("bytes=0-1,5-6", 100) is None
+
+    def test_bounded_range(self):
+        assert server.parse_range_header("bytes=10-19", 100) == (10, 19)
+
+    def test_open_ended_range(self):
+        assert server.parse_range_header("bytes=90-", 100) == (90, 99)
+
+    def test_end_is_clamped_to_size(self):
+        assert server.parse_range_header("bytes=50-500", 100) == (50, 99)
+
+    def test_suffix_range(self):
+        assert server.parse_range_header("bytes=-10", 100) == (90, 99)
+        assert server.parse_range_header("bytes=-500", 100) == (0, 99)
+
+    @pytest.mark.parametrize("header", ["bytes=100-", "bytes=20-10", "bytes=-0", "bytes=a-b"])
+    def test_unsatisfiable_ranges_raise(self, header):
+        with pytest.raises(ValueError):
+            server.parse_range_header(header, 100)
+
+
+class TestBlobResponse:
+    """ETag revalidation and Range handling when serving files"""
+
+    ETAG = '"abc123"'
+
+    @pytest.fixture
+    def blob(self, tmp_path):
+        path = tmp_path / "blob.bin"
+        path.write_bytes(bytes(range(100)))
+        return path
+
+    def respond(self, path, **headers):
+        return server.blob_response(make_request(**headers), path, "application/octet-stream", self.ETAG, "no-cache")
+
+    def test_full_body(self, blob):
+        response = self.respond(blob)
+        assert response.status_code == 200
+        assert response.headers["content-length"] == "100"
+        assert response.headers["accept-ranges"] == "bytes"
+
+    def test_partial_body(self, blob):
+        response = self.respond(blob, range="bytes=10-19")
+        assert response.status_code == 206
+        assert response.headers["content-range"] == "bytes 10-19/100"
+        assert response.headers["content-length"] == "10"
+
+    def test_unsatisfiable_range(self, blob):
+        response = self.respond(blob, range="bytes=200-")
+        assert response.status_code == 416
+        assert response.headers["content-range"] == "bytes */100"
+
+    def test_matching_etag_is_not_modified(self, blob):
+        assert self.respond(blob, if_none_match=self.ETAG).status_code == 304
+
+    def test_stale_if_range_sends_everything(self, blob):
+        response = self.respond(blob, range="bytes=10-19", if_range='"stale"')
+        assert response.status_code == 200
+        assert response.headers["content-length"] == "100"
+
+    def test_head_has_no_body(self, blob):
+        response = self.respond(blob, method="HEAD")
+        assert response.status_code == 200
+        assert response.body == b""
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(HTTPException) as error:
+            self.respond(tmp_path / "missing.bin")
+        assert error.value.status_code == 404
+
+
+class TestTakeCursor:
+    """Keyset pagination cursors for the take list"""
+
+    def test_round_trip(self):
+        take = {"is_favorite": False, "created_at": "2026-01-01T00:00:00+00:00", "id": "take-b"}
+        query = server.take_cursor_filter(server.encode_take_cursor(take))
+        assert query == {"$or": [
+            {"is_favorite": False, "created_at": take["created_at"], "id": {"$lt": "take-b"}},
+            {"is_favorite": False, "created_at": {"$lt": take["created_at"]}},
+        ]}
+
+    def test_favorites_are_followed_by_the_rest(self):
+        take = {"is_favorite": True, "created_at": "2026-01-01T00:00:00+00:00", "id": "take-a"}
+        query = server.take_cursor_filter(server.encode_take_cursor(take))
+        assert {"is_favorite": False} in query["$or"]
+
+    @pytest.mark.parametrize("cursor", ["not-a-cursor", "", "WzEsMiwzXQ"])
+    def test_invalid_cursor(self, cursor):
+        with pytest.raises(ValueError):
+            server.take_cursor_filter(cursor)
+
+
+class TestShareTokens:
+    """Signed share tokens are checked without a database lookup"""
+
+    def test_round_trip(self):
+        share_id = str(uuid.uuid4())
+        token = server.make_share_token(share_id, datetime.now(timezone.utc) + timedelta(hours=1))
+        assert server.verify_share_token(token) == share_id
+
+    def test_legacy_token_needs_lookup(self):
+        assert server.verify_share_token("0123456789abcdef") is None
+
+    def test_tampered_signature(self):
+        token = server.make_share_token(str(uuid.uuid4()), datetime.now(timezone.utc) + timedelta(hours=1))
+        with pytest.raises(HTTPException) as error:
+            server.verify_share_token(token[:-1] + ("0" if token[-1] != "0" else "1"))
+        assert error.value.status_code == 404
+
+    def test_extended_expiry_breaks_signature(self):
+        token = server.make_share_token(str(uuid.uuid4()), datetime.now(timezone.utc) + timedelta(hours=1))
+        share_hex, expires, signature = token.split(".")
+        with pytest.raises(HTTPException) as error:
+            server.verify_share_token(f"{share_hex}.{int(expires) + 3600}.{signature}")
+        assert error.value.status_code == 404
+
+    def test_expired_token(self):
+        token = server.make_share_token(str(uuid.uuid4()), datetime.now(timezone.utc) - timedelta(seconds=1))
+        with pytest.raises(HTTPException) as error:
+            server.verify_share_token(token)
+        assert error.value.status_code == 410
+
+    @pytest.mark.parametrize("token", [
+        "garbage",
+        "abc.def.ghi",
+        "../../etc/passwd",
+        # Unicode digits pass str.isdigit() but not int()
+        "a" * 32 + ".²².1234",
+        # Non-ASCII signatures make hmac.compare_digest raise TypeError
+        "a" * 32 + ".1111111111." + "é" * 32,
+    ])
+    def test_malformed_token(self, token):
+        with pytest.raises(HTTPException) as error:
+            server.verify_share_token(token)
+        assert error.value.status_code == 404
+
+    @pytest.mark.parametrize("token", ["²²." + "a" * 32, "1111111111." + "é" * 32, "garbage"])
+    def test_malformed_media_link(self, token):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(server.get_take_media("take-id", token, "original.webm", make_request()))
+        assert error.value.status_code == 403
+
+
+class TestWaveformPeaks:
+    """Peak amplitudes drawn under the take scrubber"""
+
+    def pcm(self, samples):
+        return np.array(samples, dtype="<i2").tobytes()
+
+    def test_empty_audio(self):
+        assert server.waveform_peaks(b"") == []
+        assert server.waveform_peaks(b"\x01") == []
+
+    def test_peaks_per_bucket(self):
+        assert server.waveform_peaks(self.pcm([0, 16384, -32768, 100]), buckets=2) == [0.5, 1.0]
+
+    def test_fewer_samples_than_buckets(self):
+        assert len(server.waveform_peaks(self.pcm([1000, 2000, 3000]), buckets=10)) == 3
+
+    def test_uneven_buckets(self):
+        peaks = server.waveform_peaks(self.pcm(range(0, 1000, 10)), buckets=7)
+        assert len(peaks) == 7
+        assert peaks == sorted(peaks)
+        assert all(0 <= peak <= 1 for peak in peaks)
+
+    def test_trailing_odd_byte_is_ignored(self):
+        assert server.waveform_peaks(self.pcm([16384]) + b"\x7f", buckets=1) == [0.5]
+
+
+class TestTokenBucketLimiter:
+    """Per-key token buckets behind the public endpoint rate limits"""
+
+    def test_burst_then_wait(self):
+        limiter = server.TokenBucketLimiter(per_minute=60, burst=3)
+        assert [limiter.acquire("ip") for _ in range(3)] == [0, 0, 0]
+        assert limiter.acquire("ip") == pytest.approx(1, abs=0.05)
+
+    def test_keys_are_independent(self):
+        limiter = server.TokenBucketLimiter(per_minute=60, burst=1)
+        assert limiter.acquire("a") == 0
+        assert limiter.acquire("b") == 0
+        assert limiter.acquire("a") > 0
+
+    def test_tokens_refill(self, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+        limiter = server.TokenBucketLimiter(per_minute=60, burst=1)
+        assert limiter.acquire("ip") == 0
+        assert limiter.acquire("ip") > 0
+        clock[0] += 2
+        assert limiter.acquire("ip") == 0
+
+    def test_least_recently_used_keys_are_evicted(self):
+        limiter = server.TokenBucketLimiter(per_minute=60, burst=1, max_keys=2)
+        for key in ("a", "b", "c"):
+            limiter.acquire(key)
+        assert list(limiter.buckets) == ["b", "c"]
+        # An evicted key starts over with a full bucket
+        assert limiter.acquire("a") == 0
+
+
+class TestClientIp:
+    """Rate limit keys come from the hop the trusted proxies appended"""
+
+    def test_hop_from_the_trusted_proxy(self, monkeypatch):
+        monkeypatch.setattr(server, "TRUSTED_PROXY_COUNT", 1)
+        request = make_request(x_forwarded_for="6.6.6.6, 203.0.113.7")
+        assert server.client_ip(request) == "203.0.113.7"
+
+    def test_header_ignored_without_proxies(self, monkeypatch):
+        monkeypatch.setattr(server, "TRUSTED_PROXY_COUNT", 0)
+        assert server.client_ip(make_request(x_forwarded_for="203.0.113.7")) == "unknown"
+
+    def test_short_header_falls_back_to_peer(self, monkeypatch):
+        monkeypatch.setattr(server, "TRUSTED_PROXY_COUNT", 2)
+        assert server.client_ip(make_request(x_forwarded_for="203.0.113.7")) == "unknown"
@@ -0,0 +1,280 @@
+"""
+CuePartner Take Storage and Sharing API Tests
+Tests for:
+- Resumable Uploads - POST/GET/PUT/DELETE /api/projects/{id}/takes/uploads[/{upload_id}]
+- Upload Completion - POST /api/projects/{id}/takes/uploads/{upload_id}/complete
+- MP4 Conversion Status - GET/POST /api/projects/{id}/takes/{take_id}/convert
+- Bulk Submission - POST /api/projects/{id}/takes/{take_id}/submit/bulk
+- Take Analytics - GET /api/projects/{id}/takes/{take_id}/analytics
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Test credentials
+TEST_EMAIL = "actor@demo.com"
+TEST_PASSWORD = "actor123"
+
+VIDEO_BYTES = b"WEBM_TEST_DATA_PLACEHOLDER" * 40
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    """Shared requests session"""
+    return requests.Session()
+
+
+@pytest.fixture(scope="module")
+def authenticated_client(api_client):
+    """Session with auth header"""
+    response = api_client.post(f"{BASE_URL}/api/auth/login", json={
+        "email": TEST_EMAIL,
+        "password": TEST_PASSWORD
+    })
+    if response.status_code != 200:
+        pytest.skip("Authentication failed - skipping authenticated tests")
+    api_client.headers.update({"Authorization": f"Bearer {response.json()['access_token']}"})
+    return api_client
+
+
+@pytest.fixture(scope="module")
+def project_id(authenticated_client):
+    """Throwaway project, so take limits and leftovers don't leak into other tests"""
+    response = authenticated_client.post(f"{BASE_URL}/api/projects", json={"title": "TEST_take_storage"})
+    assert response.status_code == 200, response.text
+    project_id = response.json()["id"]
+    yield project_id
+    authenticated_client.delete(f"{BASE_URL}/api/projects/{project_id}")
+
+
+def start_upload(client, project_id, **body):
+    response = client.post(f"{BASE_URL}/api/projects/{project_id}/takes/uploads", json={"content_type": "video/webm", **body})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def put_chunk(client, project_id, upload_id, offset, data):
+    return client.put(
+        f"{BASE_URL}/api/projects/{project_id}/takes/uploads/{upload_id}",
+        params={"offset": offset},
+        data=data,
+        headers={"Content-Type": "application/octet-stream"}
+    )
+
+
+def upload_take(client, project_id, data=VIDEO_BYTES):
+    upload = start_upload(client, project_id, total_size=len(data))
+    assert put_chunk(client, project_id, upload["upload_id"], 0, data).status_code == 200
+    response = client.post(
+        f"{BASE_URL}/api/projects/{project_id}/takes/uploads/{upload['upload_id']}/complete",
+        json={"duration": 5, "notes": "TEST_uploaded_take"}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture(scope="module")
+def take(authenticated_client, project_id):
+    """A take created through the upload protocol"""
+    return upload_take(authenticated_client, project_id)
+
+
+class TestResumableUpload:
+    """Chunked upload, resume after a dropped connection, and completion"""
+
+    def test_start_upload(self, authenticated_client, project_id):
+        upload = start_upload(authenticated_client, project_id, total_size=len(VIDEO_BYTES))
+        assert upload["offset"] == 0
+        assert upload["status"] == "open"
+        assert upload["total_size"] == len(VIDEO_BYTES)
+        assert upload["chunk_size"] > 0
+
+    def test_unsupported_format_is_rejected(self, authenticated_client, project_id):
+        response = authenticated_client.post(
+            f"{BASE_URL}/api/projects/{project_id}/takes/uploads",
+            json={"content_type": "image/png"}
+        )
+        assert response.status_code == 400
+
+    def test_chunks_resume_and_complete(self, authenticated_client, project_id):
+        upload = start_upload(authenticated_client, project_id, total_size=len(VIDEO_BYTES))
+        upload_id = upload["upload_id"]
+        half = len(VIDEO_BYTES) // 2
+
+        response = put_chunk(authenticated_client, project_id, upload_id, 0, VIDEO_BYTES[:half])
+        assert response.status_code == 200
+        assert response.json()["offset"] == half
+
+        # A client that lost track of the offset is told where to resume
+        response = put_chunk(authenticated_client, project_id, upload_id, 0, VIDEO_BYTES)
+        assert response.status_code == 409
+        assert response.json()["detail"]["offset"] == half
+
+        response = authenticated_client.get(f"{BASE_URL}/api/projects/{project_id}/takes/uploads/{upload_id}")
+        assert response.status_code == 200
+        assert response.json()["offset"] == half
+
+        # Completing early reports how far the upload got
+        complete_url = f"{BASE_URL}/api/projects/{project_id}/takes/uploads/{upload_id}/complete"
+        response = authenticated_client.post(complete_url, json={"duration": 5})
+        assert response.status_code == 409
+        assert response.json()["detail"]["offset"] == half
+
+        response = put_chunk(authenticated_client, project_id, upload_id, half, VIDEO_BYTES[half:])
+        assert response.status_code == 200
+        assert response.json()["offset"] == len(VIDEO_BYTES)
+
+        response = authenticated_client.post(complete_url, json={"duration": 5, "notes": "TEST_resumed"})
+        assert response.status_code == 200, response.text
+        take = response.json()
+        assert take["notes"] == "TEST_resumed"
+        assert take["video_url"]
+
+        # A retried completion hands back the same take
+        response = authenticated_client.post(complete_url, json={"duration": 5, "notes": "TEST_resumed"})
+        assert response.status_code == 200
+        assert response.json()["id"] == take["id"]
+
+        response = authenticated_client.get(f"{BASE_URL}/api/projects/{project_id}/takes/uploads/{upload_id}")
+        assert response.json()["status"] == "complete"
+        print(f"Upload {upload_id} resumed and completed as take {take['id']}")
+
+    def test_chunk_past_total_size_is_rejected(self, authenticated_client, project_id):
+        upload = start_upload(authenticated_client, project_id, total_size=10)
+        response = put_chunk(authenticated_client, project_id, upload["upload_id"], 0, VIDEO_BYTES)
+        assert response.status_code == 413
+
+    def test_upload_without_size_completes_with_final_size(self, authenticated_client, project_id):
+        upload = start_upload(authenticated_client, project_id)
+        assert upload["total_size"] is None
+        assert put_chunk(authenticated_client, project_id, upload["upload_id"], 0, VIDEO_BYTES).status_code == 200
+
+        complete_url = f"{BASE_URL}/api/projects/{project_id}/takes/uploads/{upload['upload_id']}/complete"
+        response = authenticated_client.post(complete_url, json={"duration": 5, "total_size": len(VIDEO_BYTES) + 1})
+        assert response.status_code == 409
+        response = authenticated_client.post(complete_url, json={"duration": 5, "total_size": len(VIDEO_BYTES)})
+        assert response.status_code == 200
+
+    def test_empty_upload_cannot_complete(self, authenticated_client, project_id):
+        upload = start_upload(authenticated_client, project_id)
+        response = authenticated_client.post(
+            f"{BASE_URL}/api/projects/{project_id}/takes/uploads/{upload['upload_id']}/complete",
+            json={"duration": 5}
+        )
+        assert response.status_code == 400
+
+    def test_abort_upload(self, authenticated_client, project_id):
+        upload = start_upload(authenticated_client, project_id)
+        upload_url = f"{BASE_URL}/api/projects/{project_id}/takes/uploads/{upload['upload_id']}"
+        assert authenticated_client.delete(upload_url).status_code == 200
+        assert authenticated_client.get(upload_url).status_code == 404
+
+
+class TestConversionStatus:
+    """MP4 conversion is queued as a background job"""
+
+    def test_conversion_status(self, authenticated_client, project_id, take):
+        response = authenticated_client.get(f"{BASE_URL}/api/projects/{project_id}/takes/{take['id']}/convert")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["format"] == "mp4"
+        # Completing an upload queues the conversion straight away
+        assert data["status"] in ("queued", "running", "done", "failed")
+        if data["status"] == "done":
+            assert data["video_url"]
+        print(f"Conversion status: {data['status']}")
+
+    def test_queue_conversion(self, authenticated_client, project_id, take):
+        response = authenticated_client.post(f"{BASE_URL}/api/projects/{project_id}/takes/{take['id']}/convert")
+        assert response.status_code == 200
+        assert response.json()["status"] in ("queued", "running", "done", "failed")
+
+    def test_unknown_take(self, authenticated_client, project_id):
+        response = authenticated_client.get(f"{BASE_URL}/api/projects/{project_id}/takes/missing-take/convert")
+        assert response.status_code == 404
+
+
+class TestBulkSubmission:
+    """Sending one take to several recipients"""
+
+    def test_bulk_submit(self, authenticated_client, project_id, take):
+        recipients = [
+            {"recipient_email": "casting1@example.com", "recipient_name": "TEST Casting One"},
+            {"recipient_email": "casting2@example.com", "recipient_name": "TEST Casting Two", "message": "Own note"},
+        ]
+        response = authenticated_client.post(
+            f"{BASE_URL}/api/projects/{project_id}/takes/{take['id']}/submit/bulk",
+            json={"recipients": recipients, "message": "Shared note"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["status"] == "success"
+        assert [s["recipient_email"] for s in data["submissions"]] == [r["recipient_email"] for r in recipients]
+        # Every recipient gets their own link
+        share_urls = [s["share_url"] for s in data["submissions"]]
+        assert len(set(share_urls)) == len(recipients)
+
+        response = authenticated_client.get(f"{BASE_URL}/api/projects/{project_id}/takes/{take['id']}/shares")
+        assert response.status_code == 200
+        names = {share["recipient_name"] for share in response.json()}
+        assert {"TEST Casting One", "TEST Casting Two"} <= names
+
+    def test_bulk_submit_requires_recipients(self, authenticated_client, project_id, take):
+        response = authenticated_client.post(
+            f"{BASE_URL}/api/projects/{project_id}/takes/{take['id']}/submit/bulk",
+            json={"recipients": []}
+        )
+        assert response.status_code == 422
+
+    def test_bulk_submit_rejects_invalid_email(self, authenticated_client, project_id, take):
+        response = authenticated_client.post(
+            f"{BASE_URL}/api/projects/{project_id}/takes/{take['id']}/submit/bulk",
+            json={"recipients": [{"recipient_email": "not-an-email", "recipient_name": "TEST"}]}
+        )
+        assert response.status_code == 422
+
+
+class TestTakeAnalytics:
+    """View counts over time for a take and its share links"""
+
+    def test_views_show_up_in_analytics(self, authenticated_client, project_id, take):
+        response = authenticated_client.post(
+            f"{BASE_URL}/api/projects/{project_id}/takes/{take['id']}/share",
+            json={"take_id": take["id"], "recipient_name": "TEST Analytics"}
+        )
+        assert response.status_code == 200, response.text
+        share = response.json()
+
+        token = share["share_url"].rsplit("/", 1)[-1]
+        # Public endpoint - no auth header
+        response = requests.get(f"{BASE_URL}/api/shared/{token}")
+        assert response.status_code == 200
+        assert response.json()["views"] >= 1
+
+        response = authenticated_client.get(
+            f"{BASE_URL}/api/projects/{project_id}/takes/{take['id']}/analytics",
+            params={"granularity": "hour", "days": 1}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["granularity"] == "hour"
+        assert isinstance(data["views"], list)
+        entry = next(s for s in data["shares"] if s["share_id"] == share["id"])
+        assert entry["recipient_name"] == "TEST Analytics"
+        assert entry["active"] is True
+        # Unflushed views are included in the totals
+        assert entry["views"] >= 1
+        print(f"Analytics: {entry['views']} views, {len(data['views'])} hourly buckets")
+
+    def test_invalid_granularity(self, authenticated_client, project_id, take):
+        response = authenticated_client.get(
+            f"{BASE_URL}/api/projects/{project_id}/takes/{take['id']}/analytics",
+            params={"granularity": "week"}
+        )
+        assert response.status_code == 422
+
+    def test_unknown_take(self, authenticated_client, project_id):
+        response = authenticated_client.get(f"{BASE_URL}/api/projects/{project_id}/takes/missing-take/analytics")
+        assert response.status_code == 404
@@ -20,6 +20,18 @@ import { Toaster } from "@/components/ui/sonner";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Resolve server-relative media URLs (e.g. /api/audio/...) against the backend
+const mediaUrl = (url) => (url && url.startsWith("/") ? `${BACKEND_URL}${url}` : url);
+
+// Pick the most compact cue audio rendition this browser can play
+const preferredAudioFormat = () => {
+  const probe = document.createElement("audio");
+  if (probe.canPlayType('audio/webm; codecs="opus"')) return "opus";
+  const connection = navigator.connection;
+  if (connection && (connection.saveData || connection.type === "cellular")) return "mp3_low";
+  return undefined;
+};
+
 // Auth Context
 const AuthContext = createContext(null);
 
@@ -61,7 +73,7 @@ api.interceptors.response.use(
   }
 );
 
-export { api, API };
+export { api, API, mediaUrl, preferredAudioFormat };
 
 // Auth Provider Component
 const AuthProvider = ({ children }) => {
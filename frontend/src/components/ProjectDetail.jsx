@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef } from "react";
 import { useParams, useNavigate, Link } from "react-router-dom";
-import { api } from "@/App";
+import { api, mediaUrl } from "@/App";
 import { Button } from "@/components/ui/button";
 import { Textarea } from "@/components/ui/textarea";
 import {
@@ -280,7 +280,7 @@ const ProjectDetail = () => {
       });
 
       // Play the audio
-      const audio = new Audio(response.data.audio_url);
+      const audio = new Audio(mediaUrl(response.data.audio_url));
       audioRef.current = audio;
       
       audio.onended = () => {
@@ -663,7 +663,7 @@ const ProjectDetail = () => {
                         </p>
                         {line.audio_url && (
                           <div className="mt-2">
-                            <audio src={line.audio_url} controls className="w-full h-8" />
+                            <audio src={mediaUrl(line.audio_url)} controls className="w-full h-8" />
                           </div>
                         )}
                       </div>
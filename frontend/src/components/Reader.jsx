@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef, useCallback } from "react";
 import { useParams, useNavigate, Link } from "react-router-dom";
-import { api } from "@/App";
+import { api, mediaUrl, preferredAudioFormat } from "@/App";
 import { Button } from "@/components/ui/button";
 import { Slider } from "@/components/ui/slider";
 import {
@@ -144,9 +144,31 @@ const Reader = () => {
     }
   }, [currentLineIndex, rehearsalStarted, isMuted, autoPlay]);
 
+  // Ask the server to pre-generate upcoming cue audio and pick up lines
+  // that were voiced in the background since the script was loaded
+  useEffect(() => {
+    if (!rehearsalStarted || !lines[currentLineIndex]) return;
+    
+    api.post(`/projects/${id}/rehearsal/position`, {
+      line_id: lines[currentLineIndex].id,
+      line_index: currentLineIndex,
+      audio_format: preferredAudioFormat()
+    }).then((response) => {
+      const ready = response.data.ready || {};
+      if (Object.keys(ready).length === 0) return;
+      setLines(prev => prev.map(line =>
+        !line.audio_url && ready[line.id] ? { ...line, audio_url: ready[line.id] } : line
+      ));
+    }).catch(() => {
+      // Look-ahead is best effort - cues without audio are skipped as before
+    });
+  }, [currentLineIndex, rehearsalStarted]);
+
   const fetchReaderData = async () => {
     try {
-      const response = await api.get(`/projects/${id}/reader-data`);
+      const response = await api.get(`/projects/${id}/reader-data`, {
+        params: { audio_format: preferredAudioFormat() }
+      });
       setProject(response.data);
       
       const allLines = response.data.scenes.reduce((acc, scene) => {
@@ -175,7 +197,7 @@ const Reader = () => {
     setIsAudioPlaying(true);
     
     try {
-      const audio = new Audio(audioUrl);
+      const audio = new Audio(mediaUrl(audioUrl));
       audioRef.current = audio;
       
       // Highlight words as audio plays
@@ -409,6 +431,7 @@ const Reader = () => {
 
   const stopRehearsal = () => {
     cleanup();
+    api.delete(`/projects/${id}/rehearsal`).catch(() => {});
     setRehearsalStarted(false);
     setCurrentLineIndex(0);
     setHighlightedWordIndex(-1);
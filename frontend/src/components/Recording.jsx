@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef, useCallback } from "react";
 import { useParams, useNavigate, Link } from "react-router-dom";
-import { api } from "@/App";
+import { api, mediaUrl, preferredAudioFormat } from "@/App";
 import { Button } from "@/components/ui/button";
 import { Switch } from "@/components/ui/switch";
 import { Label } from "@/components/ui/label";
@@ -92,6 +92,7 @@ const Recording = () => {
   const mediaRecorderRef = useRef(null);
   const streamRef = useRef(null);
   const chunksRef = useRef([]);
+  const liveUploadRef = useRef(null);
   const timerRef = useRef(null);
   const audioRef = useRef(null);
   const lineRefs = useRef([]);
@@ -123,7 +124,9 @@ const Recording = () => {
 
   const fetchReaderData = async () => {
     try {
-      const response = await api.get(`/projects/${id}/reader-data`);
+      const response = await api.get(`/projects/${id}/reader-data`, {
+        params: { audio_format: preferredAudioFormat() }
+      });
       setProject(response.data);
       
       const allLines = response.data.scenes.reduce((acc, scene) => {
@@ -140,13 +143,33 @@ const Recording = () => {
 
   const fetchTakes = async () => {
     try {
-      const response = await api.get(`/projects/${id}/takes`);
-      setTakes(response.data);
+      const allTakes = [];
+      let cursor = null;
+      do {
+        const response = await api.get(`/projects/${id}/takes`, {
+          params: cursor ? { cursor } : undefined
+        });
+        allTakes.push(...response.data);
+        cursor = response.headers["x-next-cursor"];
+      } while (cursor);
+      setTakes(allTakes);
     } catch (error) {
       console.error("Failed to fetch takes:", error);
     }
   };
 
+  const openTake = async (take) => {
+    setSelectedTake(take);
+    // Takes not yet moved to blob storage are listed without their video
+    if (take.video_url) return;
+    try {
+      const response = await api.get(`/projects/${id}/takes/${take.id}`);
+      setSelectedTake(response.data);
+    } catch (error) {
+      console.error("Failed to load take:", error);
+    }
+  };
+
   const initCamera = async () => {
     try {
       stopMediaStream();
@@ -198,6 +221,7 @@ const Recording = () => {
     }
 
     chunksRef.current = [];
+    startLiveUpload();
     
     const options = { mimeType: 'video/webm;codecs=vp9,opus' };
     try {
@@ -209,6 +233,7 @@ const Recording = () => {
     mediaRecorderRef.current.ondataavailable = (event) => {
       if (event.data.size > 0) {
         chunksRef.current.push(event.data);
+        enqueueLiveChunk(event.data);
       }
     };
     
@@ -256,6 +281,7 @@ const Recording = () => {
   };
 
   const resetRecording = () => {
+    discardLiveUpload();
     setRecordedBlob(null);
     setRecordedUrl(null);
     setCurrentLineIndex(0);
@@ -264,33 +290,136 @@ const Recording = () => {
     initCamera();
   };
 
+  // Upload a recording in resumable chunks, picking up from the server's
+  // offset after a dropped connection instead of starting over
+  const uploadTakeVideo = async (blob) => {
+    const { data: upload } = await api.post(`/projects/${id}/takes/uploads`, {
+      content_type: blob.type || "video/webm",
+      total_size: blob.size
+    });
+    
+    let offset = 0;
+    let failures = 0;
+    while (offset < blob.size) {
+      try {
+        const response = await api.put(
+          `/projects/${id}/takes/uploads/${upload.upload_id}`,
+          blob.slice(offset, offset + upload.chunk_size),
+          { params: { offset }, headers: { "Content-Type": "application/octet-stream" } }
+        );
+        offset = response.data.offset;
+        failures = 0;
+      } catch (error) {
+        const serverOffset = error.response?.data?.detail?.offset;
+        if (error.response?.status === 409 && serverOffset !== undefined) {
+          offset = serverOffset;
+          continue;
+        }
+        failures += 1;
+        if (failures > 5) throw error;
+        await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** failures));
+        try {
+          const status = await api.get(`/projects/${id}/takes/uploads/${upload.upload_id}`);
+          offset = status.data.offset;
+        } catch (e) {
+          // Still offline - retry the same chunk
+        }
+      }
+    }
+    return upload.upload_id;
+  };
+
+  // Progressive upload: chunks are sent while recording, so saving only has
+  // to wait for the last second of video
+  const startLiveUpload = () => {
+    const live = { uploadId: null, offset: 0, size: 0, queue: [], draining: null, failed: false };
+    live.session = api.post(`/projects/${id}/takes/uploads`, { content_type: "video/webm" })
+      .then((response) => { live.uploadId = response.data.upload_id; })
+      .catch(() => { live.failed = true; });
+    liveUploadRef.current = live;
+  };
+
+  const drainLiveUpload = async (live) => {
+    await live.session;
+    while (live.queue.length > 0 && !live.failed) {
+      const chunk = live.queue[0];
+      let sent = false;
+      for (let attempt = 0; attempt < 4 && !sent; attempt++) {
+        try {
+          const response = await api.put(
+            `/projects/${id}/takes/uploads/${live.uploadId}`,
+            chunk,
+            { params: { offset: live.offset }, headers: { "Content-Type": "application/octet-stream" } }
+          );
+          live.offset = response.data.offset;
+          sent = true;
+        } catch (error) {
+          await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+        }
+      }
+      if (!sent) {
+        // Fall back to a full upload when the take is saved
+        live.failed = true;
+        return;
+      }
+      live.queue.shift();
+    }
+  };
+
+  const enqueueLiveChunk = (chunk) => {
+    const live = liveUploadRef.current;
+    if (!live || live.failed) return;
+    live.size += chunk.size;
+    live.queue.push(chunk);
+    if (!live.draining) {
+      live.draining = drainLiveUpload(live).finally(() => { live.draining = null; });
+    }
+  };
+
+  const finishLiveUpload = async () => {
+    const live = liveUploadRef.current;
+    if (!live) return null;
+    while (live.draining) await live.draining;
+    if (live.failed || !live.uploadId || live.offset !== live.size) return null;
+    return live;
+  };
+
+  const discardLiveUpload = () => {
+    const live = liveUploadRef.current;
+    liveUploadRef.current = null;
+    if (live) {
+      live.failed = true;
+      live.session.then(() => {
+        if (live.uploadId) api.delete(`/projects/${id}/takes/uploads/${live.uploadId}`).catch(() => {});
+      });
+    }
+  };
+
   const saveTake = async () => {
     if (!recordedBlob) return;
     
     setSavingTake(true);
     try {
-      // Convert blob to base64
-      const reader = new FileReader();
-      reader.readAsDataURL(recordedBlob);
+      const live = await finishLiveUpload();
+      let uploadId = live?.uploadId;
+      if (!uploadId) {
+        discardLiveUpload();
+        uploadId = await uploadTakeVideo(recordedBlob);
+      }
+      const response = await api.post(`/projects/${id}/takes/uploads/${uploadId}/complete`, {
+        duration: recordingTime,
+        notes: takeNotes,
+        total_size: live ? live.size : recordedBlob.size
+      });
+      liveUploadRef.current = null;
       
-      reader.onloadend = async () => {
-        const base64data = reader.result;
-        
-        const response = await api.post(`/projects/${id}/takes`, {
-          project_id: id,
-          video_data: base64data,
-          duration: recordingTime,
-          notes: takeNotes
-        });
-        
-        setTakes([response.data, ...takes]);
-        toast.success(`Take ${response.data.take_number} saved!`);
-        setShowSaveDialog(false);
-        resetRecording();
-        setSavingTake(false);
-      };
+      setTakes([response.data, ...takes]);
+      toast.success(`Take ${response.data.take_number} saved!`);
+      setShowSaveDialog(false);
+      resetRecording();
     } catch (error) {
       toast.error("Failed to save take");
+    } finally {
       setSavingTake(false);
     }
   };
@@ -367,7 +496,7 @@ const Recording = () => {
       
       setShareUrl(response.data.share_url);
       
-      if (response.data.email_sent) {
+      if (response.data.email_queued || response.data.email_sent) {
         toast.success(`Self-tape sent to ${shareName}!`);
       } else {
         toast.success("Share link created! Email service not configured.");
@@ -380,24 +509,12 @@ const Recording = () => {
   };
 
   const downloadTake = (take) => {
-    // Extract base64 and convert to blob
-    const base64 = take.video_url.split(',')[1];
-    const byteCharacters = atob(base64);
-    const byteNumbers = new Array(byteCharacters.length);
-    for (let i = 0; i < byteCharacters.length; i++) {
-      byteNumbers[i] = byteCharacters.charCodeAt(i);
-    }
-    const byteArray = new Uint8Array(byteNumbers);
-    const blob = new Blob([byteArray], { type: 'video/webm' });
-    
-    const url = URL.createObjectURL(blob);
     const a = document.createElement('a');
-    a.href = url;
-    a.download = `${project?.project_title || 'self-tape'}_take${take.take_number}.webm`;
+    a.href = mediaUrl(take.mp4_url || take.video_url);
+    a.download = `${project?.project_title || 'self-tape'}_take${take.take_number}.${take.mp4_url ? 'mp4' : 'webm'}`;
     document.body.appendChild(a);
     a.click();
     document.body.removeChild(a);
-    URL.revokeObjectURL(url);
     toast.success("Download started!");
   };
 
@@ -419,7 +536,7 @@ const Recording = () => {
     if (audioRef.current) {
       audioRef.current.pause();
     }
-    const audio = new Audio(audioUrl);
+    const audio = new Audio(mediaUrl(audioUrl));
     audioRef.current = audio;
     audio.play().catch(e => console.log("Audio play failed:", e));
   };
@@ -527,7 +644,17 @@ const Recording = () => {
                       )}
                     </button>
                     
-                    <div className="flex-1 min-w-0" onClick={() => setSelectedTake(take)}>
+                    {take.thumbnail_url && (
+                      <img
+                        src={mediaUrl(take.thumbnail_url)}
+                        alt={`Take ${take.take_number}`}
+                        loading="lazy"
+                        className="w-20 aspect-video object-cover rounded-md bg-black flex-shrink-0"
+                        onClick={() => openTake(take)}
+                      />
+                    )}
+                    
+                    <div className="flex-1 min-w-0" onClick={() => openTake(take)}>
                       <div className="flex items-center gap-2">
                         <span className="font-semibold">Take {take.take_number}</span>
                         {take.is_favorite && <Star className="w-4 h-4 text-yellow-400 fill-yellow-400" />}
@@ -611,7 +738,7 @@ const Recording = () => {
           {compareTakes.map((take, idx) => (
             <div key={take.id} className="flex-1 relative">
               <video
-                src={take.video_url}
+                src={mediaUrl(take.video_url)}
                 controls
                 className="w-full h-full object-contain"
               />
@@ -657,7 +784,8 @@ const Recording = () => {
         
         <div className="flex-1 flex items-center justify-center">
           <video
-            src={selectedTake.video_url}
+            src={mediaUrl(selectedTake.video_url)}
+            poster={selectedTake.thumbnail_url ? mediaUrl(selectedTake.thumbnail_url) : undefined}
             controls
             autoPlay
             className="w-full h-full object-contain"
@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef } from "react";
 import { useParams, useNavigate } from "react-router-dom";
-import { api } from "@/App";
+import { api, mediaUrl } from "@/App";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Textarea } from "@/components/ui/textarea";
@@ -245,7 +245,7 @@ const ScriptEditor = () => {
       audioRef.current.pause();
     }
     
-    const audio = new Audio(audioUrl);
+    const audio = new Audio(mediaUrl(audioUrl));
     audioRef.current = audio;
     
     audio.onended = () => setPlayingAudio(null);
@@ -14,6 +14,15 @@ import {
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 
+const absoluteUrl = (url) => (url?.startsWith("/") ? `${BACKEND_URL}${url}` : url);
+
+// Adaptive HLS starts quickly on slow links, but only where the browser plays it natively
+const canPlayHls = () =>
+  !!document.createElement("video").canPlayType("application/vnd.apple.mpegurl");
+
+const pickVideoSource = (take) =>
+  take.playlist_url && canPlayHls() ? absoluteUrl(take.playlist_url) : absoluteUrl(take.video_url);
+
 const SharedView = () => {
   const { token } = useParams();
   const [loading, setLoading] = useState(true);
@@ -110,7 +119,8 @@ const SharedView = () => {
         {/* Video Player */}
         <div className="rounded-2xl overflow-hidden bg-black mb-6">
           <video
-            src={data.take.video_url}
+            src={pickVideoSource(data.take)}
+            poster={absoluteUrl(data.take.thumbnail_url) || undefined}
             controls
             autoPlay
             className="w-full aspect-video"